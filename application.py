@@ -3,22 +3,47 @@
 Application class for Python WSGI.
 """
 
-import sys
 import re
 import traceback
 import cgi
 import logging
 
 from .request import Request
+from .router import Router, Route
+from .dispatcher import HTTP_METHODS, DispatcherTable
+from .metrics import (MetricsProcessor, TimedBody, NO_ROUTE, timer,
+                      get_name, get_status_class)
 from .response import (Response,
                        HTTP_NOT_FOUND,
                        HTTP_METHOD_NOT_ALLOWED,
                        HTTP_ERROR,
                        HTTP_UNAUTHORIZED,
+                       HTTP_INTERNAL_SERVER_ERROR,
+                       HTTP_SERVICE_UNAVAILABLE,
                        HTTP_STATUS)
+from .thread_pool import ThreadPool, PoolFull
 
 
-HTTP_METHODS = set(['GET', 'POST', 'PUT', 'DELETE', 'HEAD', 'OPTIONS'])
+class PrefixHook(object):
+    """Hook processor called only for a request whose URL path begins
+    with the prefix, for a route which may match paths with and without
+    the prefix. If 'ignore_case' is True, then the case of the path
+    is disregarded, as it may be by the path matcher."""
+
+    def __init__(self, processor, prefix, ignore_case=False):
+        self.processor = processor
+        self.ignore_case = ignore_case
+        if ignore_case:
+            prefix = prefix.lower()
+        self.prefix = prefix
+        self.__name__ = get_name(processor)
+
+    def __call__(self, request, response):
+        path = request.path
+        if self.ignore_case:
+            path = path.lower()
+        if path.startswith(self.prefix):
+            self.processor(request, response)
 
 
 class Application(object):
@@ -45,19 +70,39 @@ class Application(object):
     If it is a string beginning with 'template:', the rest of the string
     is interpreted as a URI template, where each variable is converted into
     a regular expression named group.
+
+    The path matchers are tried in the order they were added, and the
+    first one to match is used. The lookup is done by a compiled Router,
+    which produces the same result as a linear scan would.
+
+    Processors added by 'add_before' and 'add_after' are called before
+    and after the processors or dispatcher for every request, or for the
+    requests whose URL path has a given prefix. For each route and
+    HTTP method, they are combined with the route's own processors into
+    a tuple of processors, the call chain, when the route is first used.
     """
 
     TEMPLATE_REGEXP = re.compile(r'\{([^/\}]+)\}')
 
-    def __init__(self, human_error_output=True, human_debug_output=False):
+    def __init__(self, human_error_output=True, human_debug_output=False,
+                 metrics=None, pool=None):
         """Set error and debug output flags for when the user agent
         appears to represent a human user, i.e. a browser.
+        If a 'metrics' sink is given, then the timing of each request
+        is recorded in it; see module 'metrics'.
+        The ThreadPool 'pool' is used by 'call_async'; by default one
+        is created on first use.
         """
         self.human_error_output = human_error_output
         self.human_debug_output = human_debug_output
-        self.path_handlers = []  # Tuples (URL path matcher, handler),
+        self.metrics = metrics
+        self.pool = pool
+        self.path_handlers = []  # Routes (URL path matcher, handler),
                                  # where handler may be a processor class
                                  # or a dict(method=processor callables).
+        self.router = Router(self.path_handlers)
+        self.before_hooks = []   # Tuples (prefix, processor)
+        self.after_hooks = []    # Tuples (prefix, processor)
 
     def add_map(self, path_matcher, **method_map):
         """Add a URL path matcher with a dictionary having the HTTP method
@@ -72,13 +117,10 @@ class Application(object):
         A single processor, or a sequence (tuple or list) of processors,
         may be given for a given HTTP method.
         """
-        if isinstance(path_matcher, basestring):
-            path_matcher = self.template_convert(path_matcher)
-            path_matcher = re.compile(path_matcher)
         method_map = dict([(m.upper(), p) for m,p in method_map.items()])
-        self.path_handlers.append((path_matcher, method_map))
+        self.path_handlers.append(self.get_route(path_matcher, method_map))
 
-    def add_dispatcher(self, path_matcher, dispatcher):
+    def add_dispatcher(self, path_matcher, dispatcher, factory=None):
         """Add a URL path matcher with a dispatcher class.
 
         For valid 'path_matcher' values, see the documentation for this class.
@@ -87,12 +129,50 @@ class Application(object):
         or it must provide the appropriate method(s) named for the HTTP
         methods it is to handle. Such a method will be called with
         the Request and Response instances as arguments.
+
+        The instance is created by calling the class, or 'factory' if
+        given. It is reused if the class defines 'dispatcher_scope';
+        see dispatcher.DispatcherTable.
         """
         assert isinstance(dispatcher, object)
+        table = DispatcherTable(dispatcher, factory=factory)
+        self.path_handlers.append(self.get_route(path_matcher, table))
+
+    def add_before(self, processor, prefix=''):
+        """Add a processor to be called before the processors or dispatcher
+        for each request whose URL path begins with the given prefix,
+        e.g. '/admin/'. The default empty prefix applies to all requests.
+        For a route whose regexp has a literal prefix beginning with the
+        prefix, the hook is always called. For a route which may match
+        paths both with and without the prefix, e.g. a callable path
+        matcher, a case-insensitive regexp or r'^/admin/?$', the path of
+        each request is checked, disregarding case unless the regexp
+        is known to be case-sensitive. The hooks are called in the order
+        they were added."""
+        self.before_hooks.append((prefix, processor))
+        self.reset_chains()
+
+    def add_after(self, processor, prefix=''):
+        """Add a processor to be called after the processors or dispatcher
+        for each request whose URL path begins with the given prefix;
+        see 'add_before'. It may transform the response, e.g. its headers or
+        body. It is not called if a previous processor raised an exception,
+        including HTTP_STATUS."""
+        self.after_hooks.append((prefix, processor))
+        self.reset_chains()
+
+    def reset_chains(self):
+        "Have the call chains of the routes rebuilt when next used."
+        for route in self.path_handlers:
+            if isinstance(route, Route):
+                route.chains = None
+
+    def get_route(self, path_matcher, handler):
+        "Return a Route instance for the path matcher and handler."
         if isinstance(path_matcher, basestring):
             path_matcher = self.template_convert(path_matcher)
             path_matcher = re.compile(path_matcher)
-        self.path_handlers.append((path_matcher, dispatcher))
+        return Route(path_matcher, handler)
 
     def template_convert(self, template):
         "Convert a URI template into a regular expression using named groups."
@@ -113,57 +193,63 @@ class Application(object):
         the PATH_INFO environment variable, thus excluding any path
         prefix for the virtual location of the Python WSGI application.
         """
+        response, label = self.respond(environ)
+        start_response(str(response), response.headers.items)
+        return self.get_body(environ, response, label)
+
+    def call_async(self, environ, callback):
+        """Asynchronous interface, for servers driven by an event loop.
+        The request is handled as by '__call__', but in a thread of the
+        bounded thread pool 'pool', so that the server's thread is not
+        blocked by slow processors. When the response is ready, the
+        function 'callback(status, headers, body)' is called in the pool
+        thread; 'body' is an iterable to be closed after sending it.
+        If the pool's queue is full, then the callback is called at once
+        with HTTP status '503 Service Unavailable'."""
+        def handle():
+            try:
+                response, label = self.respond(environ)
+            except Exception:   # Already logged
+                response, label = HTTP_INTERNAL_SERVER_ERROR(), None
+            callback(str(response), response.headers.items,
+                     self.get_body(environ, response, label))
+        if self.pool is None:
+            self.pool = ThreadPool(name='wireframe-application')
+        try:
+            self.pool.submit(handle)
+        except PoolFull:
+            response = HTTP_SERVICE_UNAVAILABLE('server busy')
+            callback(str(response), response.headers.items, response)
+
+    def respond(self, environ):
+        """Return a tuple (response, label) for the request, where 'label'
+        is the route label for the metrics sink, or None if no sink.
+        Exceptions other than HTTP_STATUS are logged and re-raised,
+        unless debug output is sent to a human user agent."""
         path = environ['PATH_INFO']
         logging.debug("wireframe: request URL path %s", path)
+        metrics = self.metrics
+        if metrics is not None:
+            label = NO_ROUTE
+            started = mark = timer()
         try:
-            for path_matcher, handler in self.path_handlers:
-                if callable(path_matcher): # URL path matcher is callable
-                    try:
-                        path_values = path_matcher(path)
-                    except ValueError:
-                        pass
-                    else:
-                        if path_values:
-                            path_named_values = dict()
-                            break
-                else:                     # URL path matcher is compiled regexp
-                    m = path_matcher.match(path)
-                    if m:
-                        path_values = [g for (i,g) in enumerate(m.groups())
-                                       if i+1 not in m.re.groupindex.values()]
-                        path_named_values = m.groupdict()
-                        break
-            else:
+            found = self.router.match(path)
+            if found is None:
                 raise HTTP_NOT_FOUND("URL path: %s" % path)
+            route, result = found
+            if metrics is not None:
+                label = route.label
+                mark = self.observe(label, 'match', mark)
+            path_values, path_named_values = route.values(result)
             request = self.get_request(environ, path_values, path_named_values)
             logging.debug("wireframe: request HTTP method %s",
                           request.http_method)
             response = self.get_response()
-            if isinstance(handler, dict): # Map: HTTP method to processor(s)
-                try:
-                    processors = handler[request.http_method]
-                except KeyError:
-                    allowed = handler.keys()
-                    raise HTTP_METHOD_NOT_ALLOWED(allow=','.join(allowed))
-                if isinstance(processors, (list, tuple)): # Seq of callables
-                    for processor in processors:
-                        processor(request, response)
-                else:
-                    processors(request, response) # Not a seq: single callable
-            elif isinstance(handler, object):     # Dispatcher class
-                dispatcher = handler()
-                if callable(dispatcher):          # Does its own method dispatch
-                    dispatcher(request, response)
-                else:
-                    try:
-                        method = getattr(dispatcher, request.http_method)
-                    except AttributeError:
-                        allowed = [m for m in HTTP_METHODS
-                                   if hasattr(dispatcher, m)]
-                        raise HTTP_METHOD_NOT_ALLOWED(allow=','.join(allowed))
-                    method(request, response)
+            if metrics is None:
+                self.dispatch(route, request, response)
             else:
-                raise HTTP_INTERNAL_SERVER_ERROR
+                mark = self.observe(label, 'request', mark)
+                self.dispatch(route, request, response, label)
         except HTTP_UNAUTHORIZED, response: # No logging, nor human output
             pass
         except HTTP_ERROR, response:
@@ -176,8 +262,10 @@ class Application(object):
             logging.debug("wireframe: '%s' %s: HTTP error %s %s",
                           path, http_method, response, response.remark)
             if self.human_error_output and human_user_agent:
+                http_code = response.http_code
                 response = self.to_human_output("Error: %s" % response,
                                                 response.remark)
+                response.http_code = http_code
         except HTTP_STATUS, response:
             logging.debug("wireframe: '%s' %s: HTTP status %s",
                           path, request.http_method, response)
@@ -185,13 +273,119 @@ class Application(object):
             tb = traceback.format_exc(limit=20)
             logging.error("wireframe: '%s' exception %s\n%s",
                           path, message, tb)
-            if self.human_debug_output and request.human_user_agent:
-                response = self.to_human_output('Internal error', tb)
-            else:
+            if metrics is not None:
+                metrics.count(label, environ.get('REQUEST_METHOD', '?'),
+                              'exception')
+            if not (self.human_debug_output and request.human_user_agent):
                 raise
-        start_response(str(response), response.headers.items)
+            response = self.to_human_output('Internal error', tb)
+            if metrics is None:
+                return response, None
+            self.observe(label, 'total', started)
+            return response, label  # Counted as exception, not by status
+        if metrics is None:
+            return response, None
+        metrics.count(label, environ.get('REQUEST_METHOD', '?'),
+                      get_status_class(response.http_code))
+        self.observe(label, 'total', started)
+        return response, label
+
+    def get_body(self, environ, response, label):
+        """Return the WSGI iterable for the body of the response: the file
+        wrapper if provided by the server and applicable, a TimedBody if
+        'label' is given, else the response itself."""
+        if 'wsgi.file_wrapper' in environ:
+            file = response.detach_file()
+            if file is not None:
+                response.close()
+                return environ['wsgi.file_wrapper'](file, response.block_size)
+        if label is not None:
+            return TimedBody(response, self.metrics, label)
         return response
 
+    def dispatch(self, route, request, response, label=None):
+        """Call the processors in the call chain of the route for the
+        request's HTTP method. If 'label' is given, then the time taken
+        by each is recorded in the metrics sink."""
+        chains = route.chains
+        if chains is None:
+            chains = self.set_chains(route)
+        try:
+            chain = chains[request.http_method]
+        except KeyError:
+            try:
+                chain = chains[None]
+            except KeyError:
+                raise HTTP_METHOD_NOT_ALLOWED(allow=route.allow)
+        if label is None:
+            for processor in chain:
+                processor(request, response)
+        else:
+            for processor in chain:
+                mark = timer()
+                processor(request, response)
+                self.observe(label, 'processor:' + get_name(processor), mark)
+
+    def set_chains(self, route):
+        """Set and return the call chains of the route: a dictionary with
+        the HTTP method as key and the tuple of processors to call as value.
+        The key None is for any HTTP method, for a callable dispatcher."""
+        if route.is_callable:
+            prefix = ''
+            ignore_case = True
+        else:
+            prefix = self.router.analyze(route.path_matcher)[0]
+            ignore_case = bool(route.path_matcher.flags & re.IGNORECASE)
+        before = self.get_hooks(self.before_hooks, prefix, ignore_case)
+        after = self.get_hooks(self.after_hooks, prefix, ignore_case)
+        handler = route.handler
+        chains = dict()
+        if isinstance(handler, dict): # Map: HTTP method to processor(s)
+            for http_method, processors in handler.items():
+                if not isinstance(processors, (list, tuple)): # Single callable
+                    processors = (processors,)
+                chains[http_method] = before + tuple(processors) + after
+            route.allow = ','.join(handler.keys())
+        else:
+            if not isinstance(handler, DispatcherTable): # Dispatcher class
+                handler = DispatcherTable(handler)
+            if handler.is_callable:   # Does its own method dispatch
+                http_methods = list(HTTP_METHODS) + [None]
+            else:
+                http_methods = handler.methods
+            for http_method in http_methods:
+                processor = handler.get_processor(http_method)
+                chains[http_method] = before + (processor,) + after
+            route.allow = handler.allow
+        route.chains = chains
+        return chains
+
+    def get_hooks(self, hooks, prefix, ignore_case):
+        """Return the tuple of the hooks for a route whose regexp has the
+        literal prefix. A hook whose prefix is not implied by that of the
+        route, but which may apply to paths matched by the route, is
+        wrapped in a PrefixHook checking the path of each request."""
+        result = []
+        for hook_prefix, processor in hooks:
+            if prefix.startswith(hook_prefix):
+                result.append(processor)
+            elif hook_prefix.startswith(prefix):
+                result.append(PrefixHook(processor, hook_prefix, ignore_case))
+        return tuple(result)
+
+    def observe(self, label, stage, mark):
+        """Record the time since 'mark' for the stage in the metrics sink.
+        Return the current time."""
+        now = timer()
+        self.metrics.observe(label, stage, now - mark)
+        return now
+
+    def mount_metrics(self, path='/_metrics'):
+        """Add a route for the given URL path which returns the dump
+        of the metrics sink, which must be a Metrics instance."""
+        self.add_map("^%s$" % re.escape(path),
+                     GET=MetricsProcessor(self.metrics))
+
     def to_human_output(self, title, remark):
         "Convert the error remark to a human-readable HTML response."
         response = Response()
@@ -0,0 +1,51 @@
+""" wireframe: Minimalistic Web Resource Framework built on Python WSGI.
+
+Benchmarks of wireframe's own overhead.
+
+Each module may be run as a script, e.g.:
+
+    python -m wireframe.benchmark.content_negotiate
+    python -m wireframe.benchmark.run --help
+"""
+
+import sys, time
+
+
+def measure(func, duration=0.5):
+    """Call the function repeatedly for about the given number of seconds.
+    Return the number of calls per second."""
+    func()                      # Warm up caches
+    count = 0
+    number = 1
+    start = time.time()
+    while True:
+        for i in xrange(number):
+            func()
+        count += number
+        elapsed = time.time() - start
+        if elapsed >= duration: break
+        number *= 2
+    return count / elapsed
+
+def count_calls(func):
+    """Call the function once, and return the number of Python and
+    built-in function calls made by it. Unlike the time, this number
+    is not affected by the load of the machine."""
+    counts = [0]
+    def profile(frame, event, arg):
+        if event == 'call' or event == 'c_call':
+            counts[0] += 1
+    sys.setprofile(profile)
+    try:
+        func()
+    finally:
+        sys.setprofile(None)
+    return counts[0] - 1        # Minus the call of 'setprofile'
+
+def report(name, ops, calls=None):
+    """Print a line with the name, operations per second, and optionally
+    calls per operation."""
+    line = "%-40s %12.0f ops/sec" % (name, ops)
+    if calls is not None:
+        line += " %8.1f calls/op" % calls
+    print line
@@ -0,0 +1,91 @@
+""" wireframe: Minimalistic Web Resource Framework built on Python WSGI.
+
+Harness driving many concurrent requests through 'Application.call_async',
+as an event-loop server would, using only the standard library.
+It checks that every request gets exactly one complete response, and
+reports the throughput for slow and fast routes, and the number of
+requests refused when the pool's queue is full.
+
+    python -m wireframe.benchmark.concurrent
+"""
+
+import time, threading, logging, optparse
+
+from .environ import get_environ
+from ..application import Application
+from ..thread_pool import ThreadPool
+
+
+def slow(request, response):
+    "Processor waiting for a slow backend."
+    time.sleep(0.02)
+    response.append('slow')
+
+def fast(request, response):
+    response.append('fast')
+
+def failing(request, response):
+    raise ValueError('failing processor')
+
+
+def drive(application, environs):
+    """Submit the requests all at once, and wait for their responses.
+    Return the elapsed time and a dictionary of counts per status."""
+    lock = threading.Lock()
+    finished = threading.Event()
+    statuses = dict()
+    remaining = [len(environs)]
+
+    def callback(status, headers, body):
+        try:
+            for data in body:   # Consume the body, as a server would
+                pass
+        finally:
+            if hasattr(body, 'close'): body.close()
+        with lock:
+            statuses[status] = statuses.get(status, 0) + 1
+            remaining[0] -= 1
+            if remaining[0] == 0: finished.set()
+
+    started = time.time()
+    for environ in environs:
+        application.call_async(environ, callback)
+    if not finished.wait(60.0):
+        raise RuntimeError("%s responses missing" % remaining[0])
+    return time.time() - started, statuses
+
+def get_application(size, max_queue):
+    application = Application(pool=ThreadPool(size=size, max_queue=max_queue))
+    application.add_map(r'^/slow$', GET=slow)
+    application.add_map(r'^/fast$', GET=fast)
+    application.add_map(r'^/failing$', GET=failing)
+    return application
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option('-n', '--number', type='int', default=1000,
+                      help='number of requests (default 1000)')
+    parser.add_option('-s', '--size', type='int', default=50,
+                      help='number of pool threads (default 50)')
+    options, args = parser.parse_args()
+    number = options.number
+    logging.disable(logging.ERROR) # The errors of '/failing' are expected
+
+    application = get_application(options.size, number)
+    for path in ('/slow', '/fast', '/failing'):
+        environs = [get_environ(path) for i in xrange(number)]
+        elapsed, statuses = drive(application, environs)
+        print "%-10s %6d requests %8.3f sec %8.0f req/sec %s" % \
+              (path, number, elapsed, number / elapsed, statuses)
+    print "%-10s %6d requests %8.3f sec if handled serially" % \
+          ('/slow', number, number * 0.02)
+
+    application = get_application(options.size, options.size)
+    environs = [get_environ('/slow') for i in xrange(number)]
+    elapsed, statuses = drive(application, environs)
+    print "overload   %6d requests, queue %s: %s" % (number, options.size,
+                                                      statuses)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+""" wireframe: Minimalistic Web Resource Framework built on Python WSGI.
+
+Micro-benchmark of ContentNegotiate: the previous regexp-based selection
+versus the cached type/subtype selection.
+"""
+
+from . import measure, report
+from ..headers import Headers
+from ..response import Response
+from ..content_negotiate import (ContentNegotiate, parse_accept_header,
+                                 parsed_cache, selected_cache)
+
+
+ACCEPTS = ['text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+           'application/json',
+           'text/*;q=0.5, application/json;q=0.9, */*;q=0.1',
+           '*/*']
+AVAILABLE = ['text/html', 'application/json', 'text/plain']
+
+
+class Request(object):
+    "Minimal request with only headers."
+
+    def __init__(self, accept):
+        self.headers = Headers()
+        self.headers['Accept'] = accept
+
+
+def regexp_select(request, available):
+    "The previous implementation: regexps compiled for every request."
+    for quality, content_type_rx in parse_accept_header(request):
+        for content_type in available:
+            if content_type_rx.match(content_type):
+                return content_type
+
+def main():
+    requests = [Request(accept) for accept in ACCEPTS]
+    processor = ContentNegotiate()
+
+    def previous():
+        for request in requests:
+            regexp_select(request, AVAILABLE)
+
+    response = Response()
+
+    def current():
+        for request in requests:
+            processor(request, response)
+            response.content_negotiator.select(AVAILABLE)
+
+    def uncached():
+        parsed_cache.clear()
+        selected_cache.clear()
+        current()
+
+    report('regexp select (previous)', measure(previous) * len(requests))
+    report('cached select', measure(current) * len(requests))
+    report('uncached select', measure(uncached) * len(requests))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+""" wireframe: Minimalistic Web Resource Framework built on Python WSGI.
+
+Synthetic WSGI environs for benchmarks.
+"""
+
+import StringIO, urllib
+
+
+BROWSER_ACCEPT = 'text/html,application/xhtml+xml,application/xml;q=0.9,' \
+                 'image/webp,image/apng,*/*;q=0.8,' \
+                 'application/signed-exchange;v=b3;q=0.7'
+LARGE_ACCEPT = ','.join(["application/vnd.example.v%d+json;q=0.%d"
+                         % (i, i % 10) for i in xrange(40)] + ['*/*;q=0.1'])
+USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 ' \
+             '(KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+COOKIE = '; '.join(["c%d=value%d" % (i, i) for i in xrange(10)] +
+                   ['sessionid=0123456789abcdef'])
+
+
+def get_environ(path='/', method='GET', query_string='', headers=None,
+                body='', content_type=None):
+    """Return a WSGI environ dictionary for the request.
+    The header names in 'headers' are given as in HTTP, e.g. 'User-Agent'."""
+    environ = {'REQUEST_METHOD': method,
+               'PATH_INFO': path,
+               'SCRIPT_NAME': '',
+               'QUERY_STRING': query_string,
+               'SERVER_NAME': 'localhost',
+               'SERVER_PORT': '80',
+               'SERVER_PROTOCOL': 'HTTP/1.1',
+               'REMOTE_ADDR': '127.0.0.1',
+               'wsgi.version': (1, 0),
+               'wsgi.url_scheme': 'http',
+               'wsgi.input': StringIO.StringIO(body),
+               'wsgi.errors': StringIO.StringIO(),
+               'wsgi.multithread': True,
+               'wsgi.multiprocess': False,
+               'wsgi.run_once': False}
+    if body or content_type:
+        environ['CONTENT_LENGTH'] = str(len(body))
+        environ['CONTENT_TYPE'] = content_type or 'application/octet-stream'
+    for name, value in (headers or {}).items():
+        environ['HTTP_' + name.upper().replace('-', '_')] = value
+    return environ
+
+def get_browser_environ(path='/', query_string=''):
+    "Return an environ for a GET by a browser, with cookies."
+    return get_environ(path, query_string=query_string,
+                       headers={'User-Agent': USER_AGENT,
+                                'Accept': BROWSER_ACCEPT,
+                                'Accept-Encoding': 'gzip, deflate',
+                                'Accept-Language': 'en-US,en;q=0.9',
+                                'Cookie': COOKIE})
+
+def get_urlencoded_environ(path='/', fields=None):
+    "Return an environ for a POST of urlencoded form data."
+    body = urllib.urlencode(fields or dict(a='1', b='two', c='x' * 100))
+    return get_environ(path, method='POST', body=body,
+                       content_type='application/x-www-form-urlencoded',
+                       headers={'User-Agent': USER_AGENT})
+
+def get_multipart_environ(path='/', size=64*1024):
+    "Return an environ for a POST of a multipart upload of the given size."
+    boundary = '----wireframebenchmarkboundary'
+    body = '\r\n'.join(['--' + boundary,
+                        'Content-Disposition: form-data; name="title"',
+                        '',
+                        'upload',
+                        '--' + boundary,
+                        'Content-Disposition: form-data; name="file"; '
+                        'filename="data.bin"',
+                        'Content-Type: application/octet-stream',
+                        '',
+                        'x' * size,
+                        '--' + boundary + '--',
+                        ''])
+    return get_environ(path, method='POST', body=body,
+                       content_type="multipart/form-data; boundary=%s"
+                       % boundary,
+                       headers={'User-Agent': USER_AGENT})
+
+def get_replay_environ(record):
+    """Return an environ from a captured request record, a dictionary
+    with the keys 'method', 'path', 'query_string', 'headers' and 'body',
+    all optional except 'path'."""
+    headers = record.get('headers') or {}
+    content_type = headers.pop('Content-Type', None) or \
+                   record.get('content_type')
+    return get_environ(record['path'],
+                       method=record.get('method', 'GET'),
+                       query_string=record.get('query_string', ''),
+                       headers=headers,
+                       body=record.get('body', '') or '',
+                       content_type=content_type)
+
+def refresh(environ):
+    "Rewind the input of the environ, for calling again."
+    environ['wsgi.input'].seek(0)
+    return environ
+
+def start_response(status, headers, exc_info=None):
+    "Stub WSGI 'start_response'."
+    pass
@@ -0,0 +1,111 @@
+""" wireframe: Minimalistic Web Resource Framework built on Python WSGI.
+
+Micro-benchmark of Headers: the previous implementation versus the
+slotted one with interned keys, cached items and lazy cookie.
+"""
+
+import Cookie
+
+from . import measure, report
+from .environ import get_browser_environ
+from ..headers import Headers
+
+
+class PreviousHeaders(object):
+    "The previous implementation, for comparison."
+
+    def __init__(self):
+        self._items = dict()
+        self.cookie = Cookie.SimpleCookie()
+
+    def __getitem__(self, key):
+        return self._items[self.canonical_key(key)]
+
+    def __setitem__(self, key, value):
+        if value:
+            self._items[self.canonical_key(key)] = str(value)
+        else:
+            try:
+                del self[key]
+            except KeyError:
+                pass
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __delitem__(self, key):
+        del self._items[self.canonical_key(key)]
+
+    def __iter__(self):
+        return iter(self._items)
+
+    @staticmethod
+    def canonical_key(key):
+        return key.lower().replace('_', '-')
+
+    @property
+    def items(self):
+        result = self._items.items()
+        for key, morsel in self.cookie.items():
+            value = str(morsel).split(':')[1].strip()
+            result.append(('Set-Cookie', value))
+        return result
+
+
+def previous_from_environ(environ):
+    "The previous 'Request.setup_headers'."
+    headers = PreviousHeaders()
+    for key in environ:
+        if key.startswith('HTTP_'):
+            headers[key[5:]] = str(environ[key])
+    return headers
+
+def get_cases(cls, from_environ):
+    "Return the list of (name, function) for the Headers class."
+    environ = get_browser_environ()
+
+    def request():
+        "Typical request: headers from environ, a few lookups."
+        headers = from_environ(environ)
+        headers.get('Accept')
+        headers.get('Accept-Encoding')
+        headers.get('If-None-Match')
+
+    def response():
+        "Typical response: a few headers set, items output."
+        headers = cls()
+        headers['Content-Type'] = 'text/html'
+        headers['Content-Length'] = '1234'
+        headers['ETag'] = '"abc"'
+        headers['Cache-Control'] = 'max-age=60'
+        headers.items
+
+    def response_cookie():
+        "Response setting a cookie, items output."
+        headers = cls()
+        headers['Content-Type'] = 'text/html'
+        headers.cookie['session'] = 'abcdef0123456789'
+        headers.cookie['session']['path'] = '/'
+        headers.items
+
+    return [('request headers', request),
+            ('response headers', response),
+            ('response headers with cookie', response_cookie)]
+
+def main():
+    previous = get_cases(PreviousHeaders, previous_from_environ)
+    current = get_cases(Headers, Headers.from_environ)
+    for (name, before), (name, after) in zip(previous, current):
+        ops_before = measure(before)
+        ops_after = measure(after)
+        report(name + ' (previous)', ops_before)
+        report(name, ops_after)
+        print "%-40s %12.1f usec saved per request" % \
+              ('', 1e6 / ops_before - 1e6 / ops_after)
+
+
+if __name__ == '__main__':
+    main()
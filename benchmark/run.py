@@ -0,0 +1,323 @@
+""" wireframe: Minimalistic Web Resource Framework built on Python WSGI.
+
+Benchmark suite of wireframe's overhead, calling Application instances
+directly with synthetic WSGI environs and a stub 'start_response'.
+
+    python -m wireframe.benchmark.run
+    python -m wireframe.benchmark.run --save baseline.json
+    python -m wireframe.benchmark.run --compare baseline.json
+    python -m wireframe.benchmark.run --replay captured.jsonl --app mod:app
+
+For each benchmark the operations per second, and the number of function
+calls per operation are reported; see 'measure' and 'count_calls'.
+A saved baseline is a JSON file with these values for each benchmark.
+When comparing, a benchmark whose operations per second have decreased
+by more than the threshold fraction is reported as a regression,
+and the exit status is 1.
+
+The replay file contains one JSON object per line with the keys
+'method', 'path', 'query_string', 'headers' (an object) and 'body'.
+"""
+
+import sys, os, json, shutil, tempfile, optparse, Cookie
+
+from . import measure, count_calls, report
+from .environ import (get_environ, get_browser_environ,
+                      get_urlencoded_environ, get_multipart_environ,
+                      get_replay_environ, refresh, start_response,
+                      LARGE_ACCEPT, COOKIE)
+from ..application import Application
+from ..request import Request
+from ..response import Response
+from ..dispatcher import BaseDispatcher
+from ..content_negotiate import ContentNegotiate
+from ..file_processor import FileProcessor
+from ..multipart import MultipartProcessor
+from ..cookie import RequestCookie, sign, unsign
+
+
+def call(application, environ):
+    "Call the application and consume the response body."
+    body = application(refresh(environ), start_response)
+    try:
+        for part in body: pass
+    finally:
+        close = getattr(body, 'close', None)
+        if close is not None: close()
+
+def hello(request, response):
+    response['Content-Type'] = 'text/plain'
+    response.append('hello')
+
+
+class StreamingRequest(Request):
+    stream_multipart = True
+
+
+class Dispatcher(BaseDispatcher):
+
+    def GET(self, request, response):
+        hello(request, response)
+
+
+class SharedDispatcher(Dispatcher):
+    dispatcher_scope = 'application'
+
+
+def get_routed_application(count):
+    "Return an application with the given number of regexp routes."
+    application = Application()
+    for number in xrange(count):
+        application.add_map(r"^/items%s/(?P<id>\d+)$" % number, GET=hello)
+    return application
+
+
+def routing_benchmarks():
+    result = []
+    for count in (10, 100, 1000):
+        application = get_routed_application(count)
+        router = application.router
+        last = "/items%s/42" % (count - 1)
+        router.match(last)          # Compile the router
+        result.append(("routing %s routes: match last" % count,
+                       lambda r=router, p=last: r.match(p)))
+        result.append(("routing %s routes: no match" % count,
+                       lambda r=router: r.match('/missing/42')))
+        environ = get_environ(last)
+        result.append(("application %s routes: GET last" % count,
+                       lambda a=application, e=environ: call(a, e)))
+    return result
+
+def request_benchmarks():
+    get = get_browser_environ('/items/42', query_string='a=1&b=2')
+    post = get_urlencoded_environ('/items/42')
+    multipart = get_multipart_environ('/items/42')
+
+    def setup_get():
+        request = Request(get)
+        request.headers
+        request.cookie
+        request.human_user_agent
+
+    def setup_post():
+        Request(refresh(post)).cgi_fields
+
+    def setup_multipart():
+        Request(refresh(multipart)).cgi_fields
+
+    processor = MultipartProcessor()
+
+    def stream_multipart():
+        request = StreamingRequest(refresh(multipart))
+        processor(request, None)
+        for headers, stream in request.parts:
+            stream.skip()
+
+    return [('request setup: browser GET', setup_get),
+            ('request setup: urlencoded POST', setup_post),
+            ('request setup: multipart 64K POST', setup_multipart),
+            ('request stream: multipart 64K POST', stream_multipart)]
+
+def headers_benchmarks():
+    response = Response()
+    for number in xrange(10):
+        response["X-Header-%s" % number] = "value %s" % number
+    for number in xrange(3):
+        response.headers.cookie["cookie%s" % number] = "value%s" % number
+        response.headers.cookie["cookie%s" % number]['path'] = '/'
+
+    def items():
+        response.headers.items
+
+    def set_items():
+        headers = Response().headers
+        for number in xrange(10):
+            headers["X-Header-%s" % number] = 'value'
+
+    return [('headers: items, 10 headers 3 cookies', items),
+            ('headers: set 10 items', set_items)]
+
+def cookie_benchmarks():
+    key = COOKIE.split(';')[-1].split('=')[0].strip()
+    signed = sign('0f8fad5b-d9cb-469f-a165-70867728950e', 'secret')
+    response = Response()
+    for number in xrange(3):
+        response.headers.set_cookie("cookie%s" % number, "value%s" % number,
+                                    path='/')
+
+    def simple_cookie():
+        Cookie.SimpleCookie(COOKIE)[key].value
+
+    def request_cookie():
+        RequestCookie(COOKIE)[key].value
+
+    def items():
+        response.headers.items
+
+    return [('cookie: SimpleCookie, get one key', simple_cookie),
+            ('cookie: RequestCookie, get one key', request_cookie),
+            ('cookie: unsign session id', lambda: unsign(signed, 'secret')),
+            ('headers: items, 3 set_cookie', items)]
+
+def negotiate_benchmarks():
+    available = ['text/html', 'application/json', 'text/plain']
+    processor = ContentNegotiate()
+    browser = Request(get_browser_environ())
+    large = Request(get_environ(headers={'Accept': LARGE_ACCEPT}))
+    response = Response()
+
+    def select(request):
+        processor(request, response)
+        response.content_negotiator.select(available)
+
+    return [('negotiate: browser Accept', lambda: select(browser)),
+            ('negotiate: large Accept', lambda: select(large))]
+
+def file_benchmarks(directory):
+    with open(os.path.join(directory, 'small.css'), 'wb') as outfile:
+        outfile.write('body { margin: 0; }\n' * 50)
+    with open(os.path.join(directory, 'large.bin'), 'wb') as outfile:
+        outfile.write('x' * (1024 * 1024))
+    application = Application()
+    application.add_map(r'^/static/', GET=FileProcessor(directory, '/static'))
+    small = get_browser_environ('/static/small.css')
+    large = get_browser_environ('/static/large.bin')
+    ranged = get_environ('/static/large.bin',
+                         headers={'Range': 'bytes=0-999,2000-2999'})
+    return [('file: small cached', lambda: call(application, small)),
+            ('file: 1M streamed', lambda: call(application, large)),
+            ('file: 2 byte ranges', lambda: call(application, ranged))]
+
+def dispatcher_benchmarks():
+    application = Application()
+    application.add_dispatcher(r'^/dispatch$', Dispatcher)
+    application.add_dispatcher(r'^/shared$', SharedDispatcher)
+    application.add_map(r'^/map$', GET=hello)
+    dispatch = get_environ('/dispatch')
+    shared = get_environ('/shared')
+    mapped = get_environ('/map')
+    return [('dispatcher: instantiate and call',
+             lambda: call(application, dispatch)),
+            ('dispatcher: shared instance', lambda: call(application, shared)),
+            ('dispatcher: processor map', lambda: call(application, mapped))]
+
+def hooks_benchmarks():
+    def noop(request, response):
+        pass
+    application = Application()
+    application.add_map(r'^/admin/map$', GET=hello)
+    application.add_dispatcher(r'^/admin/dispatch$', SharedDispatcher)
+    application.add_before(noop)
+    application.add_before(noop, prefix='/admin/')
+    application.add_after(noop)
+    mapped = get_environ('/admin/map')
+    dispatch = get_environ('/admin/dispatch')
+    return [('hooks: processor map, 2 before 1 after',
+             lambda: call(application, mapped)),
+            ('hooks: shared dispatcher, 2 before 1 after',
+             lambda: call(application, dispatch))]
+
+def replay_benchmarks(filename, application):
+    environs = []
+    with open(filename) as infile:
+        for line in infile:
+            line = line.strip()
+            if not line: continue
+            environs.append(get_replay_environ(json.loads(line)))
+
+    def replay():
+        for environ in environs:
+            call(application, environ)
+
+    return [("replay: %s requests" % len(environs), replay)], len(environs)
+
+def get_application(name):
+    "Return the application given as 'module:attribute'."
+    module, attribute = name.split(':', 1)
+    __import__(module)
+    return getattr(sys.modules[module], attribute)
+
+
+def run(benchmarks, duration, filter=None):
+    "Measure and report the benchmarks. Return the results dictionary."
+    results = dict()
+    for name, func, scale in benchmarks:
+        if filter and filter not in name: continue
+        ops = measure(func, duration=duration) * scale
+        calls = float(count_calls(func)) / scale
+        report(name, ops, calls)
+        results[name] = dict(ops=ops, calls=calls)
+    return results
+
+def compare(results, baseline, threshold):
+    """Report the change relative to the baseline of each benchmark.
+    Return the list of names of those which regressed."""
+    regressions = []
+    print
+    for name in sorted(results):
+        try:
+            previous = baseline[name]
+        except KeyError:
+            print "%-40s %12s" % (name, 'new')
+            continue
+        change = results[name]['ops'] / previous['ops'] - 1.0
+        flag = ''
+        if change < -threshold:
+            flag = 'REGRESSION'
+            regressions.append(name)
+        print "%-40s %+11.1f%% %+8.1f calls/op %s" % \
+              (name, 100.0 * change,
+               results[name]['calls'] - previous.get('calls', 0.0), flag)
+    return regressions
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option('-d', '--duration', type='float', default=0.5,
+                      help='seconds per benchmark (default 0.5)')
+    parser.add_option('-f', '--filter',
+                      help='run only benchmarks whose name contains this')
+    parser.add_option('-s', '--save', metavar='FILE',
+                      help='save the results as baseline JSON file')
+    parser.add_option('-c', '--compare', metavar='FILE',
+                      help='compare the results with baseline JSON file')
+    parser.add_option('-t', '--threshold', type='float', default=0.1,
+                      help='fractional decrease considered a regression '
+                           '(default 0.1)')
+    parser.add_option('-r', '--replay', metavar='FILE',
+                      help='replay the requests in this JSON lines file')
+    parser.add_option('-a', '--app', metavar='MODULE:ATTRIBUTE',
+                      help='application for replay')
+    options, args = parser.parse_args()
+    if options.replay and not options.app:
+        parser.error('--replay requires --app')
+
+    directory = tempfile.mkdtemp()
+    try:
+        benchmarks = []
+        for name, func in routing_benchmarks() + request_benchmarks() + \
+                          headers_benchmarks() + cookie_benchmarks() + \
+                          negotiate_benchmarks() + \
+                          file_benchmarks(directory) + dispatcher_benchmarks() + \
+                          hooks_benchmarks():
+            benchmarks.append((name, func, 1))
+        if options.replay:
+            replays, count = replay_benchmarks(options.replay,
+                                               get_application(options.app))
+            for name, func in replays:
+                benchmarks.append((name, func, count))
+        results = run(benchmarks, options.duration, filter=options.filter)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if options.save:
+        with open(options.save, 'w') as outfile:
+            json.dump(results, outfile, indent=2, sort_keys=True)
+    if options.compare:
+        with open(options.compare) as infile:
+            baseline = json.load(infile)
+        if compare(results, baseline, options.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+""" wireframe: Minimalistic Web Resource Framework built on Python WSGI.
+
+Processor for compressing the response body according to
+the 'Accept-Encoding' HTTP header of the request.
+
+It is a post-filter: it must be the last processor in the sequence,
+after the processors producing the response body. A body containing
+only strings is compressed at once; a streaming body (iterator or
+FileBody parts) is compressed incrementally while it is being sent.
+"""
+
+import zlib
+
+from .response import iter_body
+
+
+COMPRESSIBLE_TYPES = set(['application/json',
+                          'application/javascript',
+                          'application/x-javascript',
+                          'application/xml',
+                          'application/xhtml+xml',
+                          'application/atom+xml',
+                          'application/rss+xml',
+                          'image/svg+xml'])
+
+UNCOMPRESSED_CODES = set([204, 206, 304])
+
+WBITS = dict(gzip=16 + zlib.MAX_WBITS,
+             deflate=zlib.MAX_WBITS)
+
+
+def get_encoded_etag(etag, encoding):
+    "Return the ETag for the representation with the content encoding."
+    return "%s-%s\"" % (etag[:-1], encoding)
+
+def strip_etag_encoding(etag):
+    """Return the ETag without any content encoding suffix added by
+    'get_encoded_etag', i.e. the ETag of the unencoded representation."""
+    for encoding in WBITS:
+        suffix = "-%s\"" % encoding
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+def get_encoding(request, encodings=('gzip', 'deflate')):
+    """Return the best of the given content encodings acceptable according
+    to the 'Accept-Encoding' header of the request, or None if none.
+    Of encodings with equal quality, the first given is preferred."""
+    accept = request.headers.get('Accept-Encoding')
+    if not accept: return None
+    qualities = dict()
+    for item in accept.split(','):
+        parts = item.split(';')
+        coding = parts[0].strip().lower()
+        if not coding: continue
+        quality = 1.0
+        for param in parts[1:]:
+            param = param.replace(' ', '')
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    pass
+        qualities[coding] = quality
+    best = None
+    best_quality = 0.0
+    for encoding in encodings:
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if quality > best_quality:
+            best = encoding
+            best_quality = quality
+    return best
+
+def add_vary(response, name):
+    "Add the header name to the 'Vary' header of the response."
+    vary = response.get('Vary')
+    if not vary:
+        response['Vary'] = name
+    elif name.lower() not in [v.strip().lower() for v in vary.split(',')]:
+        response['Vary'] = "%s, %s" % (vary, name)
+
+def iter_compress(chunks, encoding, level):
+    "Return a generator compressing the given chunks incrementally."
+    compressor = zlib.compressobj(level, zlib.DEFLATED, WBITS[encoding])
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data: yield data
+    yield compressor.flush()
+
+
+class CompressProcessor(object):
+    """Processor compressing the response body using gzip or deflate,
+    if the user agent accepts it, and the content type is text or
+    one of those in 'content_types'. Bodies known to be shorter than
+    'min_size' bytes are not compressed."""
+
+    def __init__(self, min_size=1024, level=6, content_types=None,
+                 encodings=('gzip', 'deflate')):
+        self.min_size = min_size
+        self.level = level
+        if content_types is None:
+            content_types = COMPRESSIBLE_TYPES
+        self.content_types = set(content_types)
+        self.encodings = encodings
+
+    def __call__(self, request, response):
+        if not self.is_compressible(response): return
+        add_vary(response, 'Accept-Encoding')
+        if response.get('Content-Encoding'): return
+        encoding = get_encoding(request, self.encodings)
+        if not encoding: return
+        parts = response.body
+        if all([isinstance(p, basestring) for p in parts]):
+            data = ''.join([str(p) for p in parts])
+            if len(data) < self.min_size: return
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED,
+                                          WBITS[encoding])
+            data = compressor.compress(data) + compressor.flush()
+            response.body = [data]
+            response['Content-Length'] = str(len(data))
+        else:
+            try:
+                if int(response['Content-Length']) < self.min_size: return
+            except (KeyError, ValueError):
+                pass
+            for part in parts:    # Close the original parts on cleanup
+                if hasattr(part, 'close'):
+                    response.cleanup.append(part.close)
+            response.body = [iter_compress(iter_body(parts),
+                                           encoding, self.level)]
+            response['Content-Length'] = None
+        response['Content-Encoding'] = encoding
+        response['Accept-Ranges'] = None
+        etag = response.get('ETag')   # Another representation; another ETag
+        if etag and etag.endswith('"'):
+            response['ETag'] = get_encoded_etag(etag, encoding)
+
+    def is_compressible(self, response):
+        "Is the response of a kind that may be compressed?"
+        if response.http_code in UNCOMPRESSED_CODES: return False
+        return self.is_content_type_compressible(response.get('Content-Type'))
+
+    def is_content_type_compressible(self, content_type):
+        "Is the given content type one that may be compressed?"
+        if not content_type: return False
+        content_type = content_type.split(';')[0].strip().lower()
+        return content_type.startswith('text/') or \
+               content_type in self.content_types
@@ -0,0 +1,180 @@
+""" wireframe: Minimalistic Web Resource Framework built on Python WSGI.
+
+Thread-safe pool of DB-API connections.
+
+The pool is given a callable producing a new connection; it knows
+nothing else about the database module, so any DB-API module
+(or a fake one) can be used with it.
+"""
+
+import time, threading, logging
+
+
+class PoolTimeout(Exception):
+    "No connection became available in the pool within the timeout."
+    pass
+
+
+class PooledConnection(object):
+    "A connection with its creation time and the time it was last used."
+
+    __slots__ = ('connection', 'created', 'used')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created = self.used = time.time()
+
+
+class ConnectionPool(object):
+    """Thread-safe pool of DB-API connections produced by 'connect',
+    a callable taking no arguments.
+
+    At most 'max_size' connections are open at the same time; a checkout
+    when all are in use waits at most 'timeout' seconds, and then raises
+    PoolTimeout. An idle connection is closed when it has been unused for
+    'idle_timeout' seconds, unless that would leave fewer than 'min_size'
+    connections open, and any connection is closed when it is older than
+    'max_lifetime' seconds. If 'ping' is True, an idle connection is
+    checked by calling its 'ping' method on checkout, and is replaced
+    if that fails. A connection is rolled back when checked in."""
+
+    def __init__(self, connect, min_size=0, max_size=10, timeout=10.0,
+                 idle_timeout=300.0, max_lifetime=3600.0, ping=True):
+        assert max_size > 0
+        assert 0 <= min_size <= max_size
+        self.connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.ping = ping
+        self.idle = []          # PooledConnection instances; last most recent
+        self.in_use = dict()    # Key: id(connection)
+        self.opening = 0        # Number of connections being opened
+        self.returning = 0      # Number of connections being checked in
+        self.closed = False
+        self.condition = threading.Condition(threading.Lock())
+
+    def __len__(self):
+        "Return the number of open connections."
+        return len(self.idle) + len(self.in_use) + self.opening + \
+               self.returning
+
+    def checkout(self):
+        """Return a connection from the pool, opening a new one if needed.
+        Raise PoolTimeout if none became available within the timeout."""
+        deadline = None
+        with self.condition:
+            while True:
+                if self.closed:
+                    raise ValueError('connection pool is closed')
+                self.expire()
+                if self.idle:
+                    pooled = self.idle.pop()
+                    self.in_use[id(pooled.connection)] = pooled
+                    break
+                if len(self) < self.max_size:
+                    pooled = None
+                    self.opening += 1   # Reserve a slot while connecting
+                    break
+                if deadline is None:
+                    deadline = time.time() + self.timeout
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise PoolTimeout("no connection available in %s seconds"
+                                      % self.timeout)
+                self.condition.wait(remaining)
+        if pooled is not None:
+            if not self.ping or self.check(pooled.connection):
+                return pooled.connection
+            with self.condition:
+                del self.in_use[id(pooled.connection)]
+                self.opening += 1
+        return self.open()
+
+    def open(self):
+        "Open a new connection in the slot reserved by 'checkout'."
+        try:
+            connection = self.connect()
+        except:
+            with self.condition:
+                self.opening -= 1
+                self.condition.notify()
+            raise
+        with self.condition:
+            self.opening -= 1
+            self.in_use[id(connection)] = PooledConnection(connection)
+        return connection
+
+    def checkin(self, connection):
+        """Return the connection to the pool after rolling it back.
+        It is closed if the pool is closed, or the connection is too old
+        or cannot be rolled back. It is counted as open until it is
+        idle or closed, and only then is a waiting checkout notified."""
+        with self.condition:
+            pooled = self.in_use.pop(id(connection), None)
+            if pooled is None: return   # Not from this pool
+            self.returning += 1
+        try:
+            connection.rollback()
+        except Exception, message:
+            logging.warning("wireframe: connection pool rollback: %s", message)
+            reusable = False
+        else:
+            pooled.used = time.time()
+            reusable = pooled.used - pooled.created < self.max_lifetime
+        with self.condition:
+            if reusable and not self.closed:
+                self.returning -= 1
+                self.idle.append(pooled)
+                self.condition.notify()
+                return
+        self.close_connection(connection)
+        with self.condition:
+            self.returning -= 1
+            self.condition.notify()
+
+    def check(self, connection):
+        "Is the connection alive? Close it if not."
+        try:
+            connection.ping()
+        except Exception, message:
+            logging.info("wireframe: connection pool ping: %s", message)
+            self.close_connection(connection)
+            return False
+        return True
+
+    def expire(self):
+        """Close idle connections that have been unused too long or are
+        too old, keeping at least 'min_size' open.
+        Must be called with the condition lock held."""
+        now = time.time()
+        keep = []
+        count = len(self)
+        for pooled in self.idle:        # Oldest use first
+            if now - pooled.created >= self.max_lifetime or \
+               (now - pooled.used >= self.idle_timeout and
+                count > self.min_size):
+                self.close_connection(pooled.connection)
+                count -= 1
+            else:
+                keep.append(pooled)
+        self.idle = keep
+
+    def close_connection(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close(self):
+        """Close all idle connections, and any in-use connections
+        when they are checked in."""
+        with self.condition:
+            self.closed = True
+            idle = self.idle
+            self.idle = []
+            self.condition.notify_all()
+        for pooled in idle:
+            self.close_connection(pooled.connection)
@@ -10,28 +10,44 @@ Per Kraulis
 import re
 
 from .response import HTTP_NOT_ACCEPTABLE
+from .lru_cache import LRUCache
+
+
+parsed_cache = LRUCache(256)   # Key: Accept header value
+selected_cache = LRUCache(512) # Key: (Accept header value, available tuple)
+MISSING = object()
 
 
 class ContentNegotiate(object):
     """Processor class for server-side content negotiation.
     Parse the 'Accept' HTTP header of the request and set the
-    member 'content_negotiator' in the response instance to this
-    instance, which provides different resolution functions."""
+    member 'content_negotiator' in the response instance to a copy of
+    this instance for the request, which provides different resolution
+    functions.
+    A media range matches a content type by type and subtype, where '*'
+    matches anything. The quality for a content type is that of the most
+    specific media range matching it; quality 0 means not acceptable."""
 
     def __call__(self, request, response):
-        self.accept_types = parse_accept_header(request)
-        response.content_negotiator = self
+        negotiator = self.__class__.__new__(self.__class__)
+        negotiator.__dict__.update(self.__dict__)
+        negotiator.accept = request.headers.get('Accept', '')
+        negotiator.accept_ranges = parse_accept(negotiator.accept)
+        response.content_negotiator = negotiator
+
+    @property
+    def accept_types(self):
+        """The list of tuples (quality, content_type_re) in descending
+        order, as produced by 'parse_accept_header'."""
+        return parse_accept_value(self.accept)
 
     def select(self, available=[]):
         """Select the best content type out of the list of available ones.
         If no 'Accept' header was provided by the request,
         then return the first entry in the content_types list.
         If no choice can be made, raise HTTP 'Not Acceptable'."""
-        if self.accept_types:
-            for quality, content_type_rx in self.accept_types:
-                for content_type in available:
-                    if content_type_rx.match(content_type):
-                        return content_type
+        if self.accept_ranges:
+            return select_content_type(self.accept, available)
         else:
             try:
                 return available[0]
@@ -41,7 +57,7 @@ class ContentNegotiate(object):
 
     def is_acceptable(self, content_type):
         "Is the given content type acceptable for the request?"
-        return is_content_type_acceptable(content_type, self.accept_types)
+        return get_quality(content_type, self.accept_ranges) > 0.0
 
     def check_acceptable(self, content_type):
         "Raise HTTP error 'Not Acceptable' if the specified content type isn't."
@@ -49,14 +65,90 @@ class ContentNegotiate(object):
             raise HTTP_NOT_ACCEPTABLE
 
 
+def parse_accept(value):
+    """Parse the value of an 'Accept' header into a tuple of media ranges
+    (quality, major, minor), where 'major' is the type and 'minor' the
+    subtype, in descending order of quality.
+    Media range parameters other than 'q' are ignored.
+    The result is cached."""
+    result = parsed_cache.get(value)
+    if result is not None: return result
+    result = []
+    for position, item in enumerate(value.split(',')):
+        parts = item.split(';')
+        media_range = parts[0].strip().lower()
+        if not media_range: continue
+        try:
+            major, minor = media_range.split('/', 1)
+        except ValueError:
+            major, minor = media_range, '*'
+        quality = 1.0
+        for param in parts[1:]:
+            param = param.replace(' ', '')
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    pass
+        result.append((-quality, position, major.strip(), minor.strip()))
+    result.sort()
+    result = tuple([(-item[0], item[2], item[3]) for item in result])
+    parsed_cache.put(value, result)
+    return result
+
+def get_quality(content_type, accept_ranges):
+    """Return the quality of the content type given the media ranges,
+    which is that of the most specific media range matching it,
+    or 0.0 if none matches."""
+    try:
+        major, minor = content_type.lower().split('/', 1)
+    except ValueError:
+        return 0.0
+    best = -1
+    quality = 0.0
+    for q, range_major, range_minor in accept_ranges:
+        if range_major == major:
+            if range_minor == minor:
+                return q        # Most specific possible
+            elif range_minor == '*' and best < 1:
+                best = 1
+                quality = q
+        elif range_major == '*' and range_minor == '*' and best < 0:
+            best = 0
+            quality = q
+    return quality
+
+def select_content_type(accept, available):
+    """Return the content type among those available having the highest
+    quality according to the 'Accept' header value, or None if none is
+    acceptable. Of those with equal quality, the first available is chosen.
+    The result is cached."""
+    key = (accept, tuple(available))
+    result = selected_cache.get(key, MISSING)
+    if result is not MISSING: return result
+    accept_ranges = parse_accept(accept)
+    result = None
+    best = 0.0
+    for content_type in available:
+        quality = get_quality(content_type, accept_ranges)
+        if quality > best:
+            result = content_type
+            best = quality
+    selected_cache.put(key, result)
+    return result
+
 def parse_accept_header(request):
     """Parse the 'Accept' header for mimetype and quality values.
     Return the result as a list sorted in descending order
     containing tuples of (quality, content_type_re), where
     'content_type_re' is a compiled regexp translation of the given
     content type specification, handling '*' and '.' properly."""
+    return parse_accept_value(request.headers.get('Accept', ''))
+
+def parse_accept_value(value):
+    "Parse the 'Accept' header value as for 'parse_accept_header'."
     result = []
-    for item in request.headers.get('Accept', '').split(','):
+    for item in value.split(','):
         item = item.strip()
         if not item: continue
         try:
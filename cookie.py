@@ -0,0 +1,145 @@
+""" wireframe: Minimalistic Web Resource Framework built on Python WSGI.
+
+Lightweight handling of cookies, and signed cookie values.
+
+RequestCookie is a read-only mapping of the cookies in a request's
+Cookie header. The header is split into name and coded value only when
+a cookie is first looked up, taking a double-quoted value as a whole
+even if it contains ';', and only the values actually looked up are
+decoded, which is much cheaper than Cookie.SimpleCookie for browser
+requests carrying many cookies of which a processor needs only one.
+As with SimpleCookie, each value is an object with the attributes
+'key', 'value' and 'coded_value', and the last of several cookies
+with the same name is used.
+
+The function 'format_set_cookie' produces the value of a 'Set-Cookie'
+header directly; it is used by 'Headers.set_cookie'.
+
+The functions 'sign' and 'unsign' add and check an HMAC signature of a
+cookie value, so that a forged value, such as a guessed session
+identifier, can be rejected without looking it up anywhere.
+"""
+
+import Cookie, re, hmac, hashlib, base64, collections
+
+
+# Cookie attribute names, which are not cookies when in a Cookie header.
+RESERVED = frozenset(Cookie.Morsel._reserved.keys())
+
+# A cookie 'name=value' up to the next ';' outside a quoted value.
+PAIR_PATTERN = re.compile(r'\s*([^=;]*?)\s*=\s*'
+                          r'("(?:[^\\"]|\\.)*"|[^;]*?)\s*(?:;|$)')
+
+
+class CookieValue(object):
+    "The value of a cookie; the Morsel attributes used for a request."
+
+    __slots__ = ('key', 'value', 'coded_value')
+
+    def __init__(self, key, value, coded_value):
+        self.key = key
+        self.value = value
+        self.coded_value = coded_value
+
+    def __repr__(self):
+        return "<CookieValue: %s=%r>" % (self.key, self.value)
+
+
+class RequestCookie(collections.Mapping):
+    """Read-only mapping of the cookies in the Cookie header value,
+    which is parsed on first lookup, each value being decoded on
+    first lookup of it."""
+
+    __slots__ = ('header', '_coded', '_values')
+
+    def __init__(self, header=None):
+        self.header = header or ''
+        self._coded = None          # Key: name; value: coded value
+        self._values = dict()       # Key: name; value: CookieValue
+
+    def get_coded(self):
+        "Return the dictionary of coded values, splitting the header."
+        if self._coded is None:
+            coded = dict()
+            for match in PAIR_PATTERN.finditer(self.header):
+                key, value = match.groups()
+                if not key or key[0] == '$' or key.lower() in RESERVED:
+                    continue
+                coded[key] = value
+            self._coded = coded
+        return self._coded
+
+    def __getitem__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            coded_value = self.get_coded()[key]
+            result = CookieValue(key, Cookie._unquote(coded_value),
+                                 coded_value)
+            self._values[key] = result
+            return result
+
+    def __contains__(self, key):
+        return key in self.get_coded()
+
+    def __iter__(self):
+        return iter(self.get_coded())
+
+    def __len__(self):
+        return len(self.get_coded())
+
+    def __str__(self):
+        return '; '.join(["%s=%s" % item
+                          for item in sorted(self.get_coded().items())])
+
+    def __repr__(self):
+        return "<RequestCookie: %s>" % self
+
+
+def format_set_cookie(key, value, path=None, domain=None, expires=None,
+                      max_age=None, secure=False, httponly=False):
+    """Return the value of a 'Set-Cookie' header. The value is quoted
+    if necessary. 'expires' is either a date string in the cookie format,
+    or the number of seconds from now."""
+    parts = ["%s=%s" % (key, Cookie._quote(str(value)))]
+    if path: parts.append("Path=%s" % path)
+    if domain: parts.append("Domain=%s" % domain)
+    if expires is not None:
+        if not isinstance(expires, basestring):
+            expires = Cookie._getdate(expires)
+        parts.append("expires=%s" % expires)
+    if max_age is not None: parts.append("Max-Age=%d" % max_age)
+    if secure: parts.append('secure')
+    if httponly: parts.append('httponly')
+    return '; '.join(parts)
+
+
+try:
+    from hmac import compare_digest as equal
+except ImportError:                     # Python < 2.7.7
+    def equal(a, b):
+        "Compare the strings in time independent of where they differ."
+        if len(a) != len(b): return False
+        result = 0
+        for x, y in zip(a, b):
+            result |= ord(x) ^ ord(y)
+        return result == 0
+
+
+def get_signature(value, secret):
+    "Return the HMAC-SHA256 signature of the value, URL-safe base64 encoded."
+    digest = hmac.new(secret, value, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip('=')
+
+def sign(value, secret):
+    "Return the value with its signature appended, separated by a dot."
+    value = str(value)
+    return "%s.%s" % (value, get_signature(value, secret))
+
+def unsign(signed, secret):
+    """Return the value if the signature of the signed value is valid,
+    else None. The signature is compared in constant time."""
+    value, sep, signature = signed.rpartition('.')
+    if not sep: return None
+    if not equal(signature, get_signature(value, secret)): return None
+    return value
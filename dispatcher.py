@@ -6,14 +6,139 @@ Per Kraulis
 2011-01-26
 """
 
-from .application import HTTP_METHODS
+import inspect, threading
+
 from .response import HTTP_METHOD_NOT_ALLOWED, HTTP_NO_CONTENT
 
 
+HTTP_METHODS = set(['GET', 'POST', 'PUT', 'DELETE', 'HEAD', 'OPTIONS'])
+
+# Key: dispatcher class; value: 'Allow' header value.
+allowed_cache = dict()
+
+
+def get_methods(cls):
+    """Return the sorted list of the names of the HTTP methods implemented
+    by the class: its callable attributes with all-uppercase names,
+    which includes any extension method, such as 'PATCH'."""
+    return sorted([name for name in dir(cls)
+                   if name.isupper() and callable(getattr(cls, name, None))])
+
+def get_allowed(cls):
+    """Return the value for the 'Allow' header: the names of the HTTP
+    methods implemented by the class. The result is cached."""
+    try:
+        return allowed_cache[cls]
+    except KeyError:
+        result = ','.join(get_methods(cls))
+        allowed_cache[cls] = result
+        return result
+
+def is_instance_callable(cls):
+    "Are instances of the class callable?"
+    return any(['__call__' in vars(base) for base in inspect.getmro(cls)
+                if base is not object])
+
+def uses_base_call(cls):
+    """Do instances of the class use the '__call__' of BaseDispatcher,
+    i.e. the 'prepare' method followed by the method for the HTTP method?"""
+    call = getattr(cls, '__call__', None)
+    return getattr(call, 'im_func', None) is BaseDispatcher.__dict__['__call__']
+
+
+class DispatcherTable(object):
+    """The handler for a dispatcher class added by 'add_dispatcher'.
+    Whether its instances are callable, their HTTP method functions, and
+    the 'Allow' header value are determined once when it is registered.
+    A BaseDispatcher subclass which doesn't redefine '__call__' is handled
+    through the method table, calling 'prepare' before the method, as
+    'BaseDispatcher.__call__' would do, but without its per-request lookup.
+
+    By default a new dispatcher instance is created for each request.
+    A stateless dispatcher class may opt in to reuse by defining the class
+    attribute 'dispatcher_scope' as 'application', for a single instance,
+    or 'thread', for one instance per thread. The instances are created
+    by calling the class, or the 'factory' callable if given."""
+
+    SCOPES = ('request', 'application', 'thread')
+
+    def __init__(self, dispatcher, factory=None):
+        self.dispatcher = dispatcher
+        self.name = dispatcher.__name__
+        self.factory = factory or dispatcher
+        self.scope = getattr(dispatcher, 'dispatcher_scope', 'request')
+        if self.scope not in self.SCOPES:
+            raise ValueError("invalid dispatcher_scope '%s'" % self.scope)
+        self.is_callable = is_instance_callable(dispatcher)
+        self.prepare = self.is_callable and uses_base_call(dispatcher)
+        if self.prepare:
+            self.is_callable = False
+        self.methods = dict()   # Key: HTTP method; value: method name
+        if not self.is_callable:
+            for name in get_methods(dispatcher):
+                self.methods[name] = name
+        self.allow = ','.join(sorted(self.methods))
+        self.instance = None
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def get_instance(self):
+        "Return a dispatcher instance according to the scope."
+        if self.scope == 'request':
+            return self.factory()
+        elif self.scope == 'thread':
+            try:
+                return self.local.instance
+            except AttributeError:
+                self.local.instance = self.factory()
+                return self.local.instance
+        else:
+            if self.instance is None:
+                with self.lock:
+                    if self.instance is None:
+                        self.instance = self.factory()
+            return self.instance
+
+    def call(self, http_method, request, response):
+        """Call the dispatcher for the HTTP method.
+        Raise HTTP_METHOD_NOT_ALLOWED if none."""
+        if self.is_callable:
+            self.get_instance()(request, response)
+            return
+        try:
+            name = self.methods[http_method]
+        except KeyError:
+            raise HTTP_METHOD_NOT_ALLOWED(allow=self.allow)
+        instance = self.get_instance()
+        if self.prepare:
+            instance.prepare(request, response)
+        getattr(instance, name)(request, response)
+
+    def get_processor(self, http_method):
+        """Return a processor calling the dispatcher for the HTTP method,
+        or for any HTTP method if None."""
+        return DispatcherMethod(self, http_method)
+
+
+class DispatcherMethod(object):
+    "Processor calling the dispatcher of a DispatcherTable."
+
+    __slots__ = ('table', 'http_method', '__name__')
+
+    def __init__(self, table, http_method):
+        self.table = table
+        self.http_method = http_method
+        self.__name__ = "%s.%s" % (table.name, http_method or '*')
+
+    def __call__(self, request, response):
+        self.table.call(self.http_method or request.http_method,
+                        request, response)
+
+
 class BaseDispatcher(object):
     """Base Dispatcher class.
     Elaborate this class by implementing methods named for the
-    HTTP request methods to be handled by this dispatcher. 
+    HTTP request methods to be handled by this dispatcher.
     The name of HTTP request method is used to identify the class
     method to call. That is, if the HTTP request is 'GET', then
     the GET method will be called with the Request and Response
@@ -29,8 +154,7 @@ class BaseDispatcher(object):
         try:
             method = getattr(self, request.http_method)
         except AttributeError:
-            allowed = [m for m in HTTP_METHODS if hasattr(self, m)]
-            raise HTTP_METHOD_NOT_ALLOWED(allow=','.join(allowed))
+            raise HTTP_METHOD_NOT_ALLOWED(allow=get_allowed(self.__class__))
         self.prepare(request, response)
         method(request, response)
 
@@ -42,5 +166,4 @@ class BaseDispatcher(object):
         pass
 
     def OPTIONS(self, request, response):
-        allowed = [m for m in HTTP_METHODS if hasattr(self, m)]
-        raise HTTP_NO_CONTENT(allow=','.join(allowed))
+        raise HTTP_NO_CONTENT(allow=get_allowed(self.__class__))
@@ -6,23 +6,168 @@ prefix to the specified root.
 
 The content type is set to the mimetype guessed from the filename extension.
 
+The file is sent in chunks; it is never read into memory as a whole.
+The mimetype and validators ('ETag' and 'Last-Modified') of files,
+and the contents of small files, are kept in a bounded cache, which
+is checked against the modification time and size of the file.
+Conditional requests ('If-None-Match', 'If-Modified-Since') are
+answered by HTTP status 'Not Modified' without reading the file.
+Byte range requests ('Range', 'If-Range') are answered by HTTP status
+'Partial Content', where each range is read by seeking in the file.
+If the user agent accepts gzip encoding, and there is a sibling file
+with the extension '.gz' which is not older than the file, then that
+precompressed file is returned instead.
+
 Per Kraulis
 2009-11-14
 """
 
-import os.path, mimetypes, logging
+import os, os.path, stat, mimetypes, logging, threading, collections, uuid
+import email.utils
+
+from .compress_processor import get_encoding, add_vary, strip_etag_encoding
+from .response import (FileBody, BLOCK_SIZE, HTTP_INTERNAL_SERVER_ERROR,
+                       HTTP_FORBIDDEN, HTTP_NOT_FOUND, HTTP_NOT_MODIFIED,
+                       HTTP_PARTIAL_CONTENT,
+                       HTTP_REQUESTED_RANGE_NOT_SATISFIABLE)
+
+
+MAX_RANGES = 16         # More ranges than this in a request are ignored
+
+
+def parse_range(value, size):
+    """Parse the value of a 'Range' header for a file of the given size.
+    Return a list of tuples (first, last) of byte positions, inclusive,
+    for the satisfiable ranges, which may be an empty list.
+    Return None if the value is invalid, or has too many ranges,
+    in which case the header must be ignored."""
+    try:
+        unit, specs = value.split('=', 1)
+    except ValueError:
+        return None
+    if unit.strip().lower() != 'bytes': return None
+    specs = specs.split(',')
+    if len(specs) > MAX_RANGES: return None
+    result = []
+    valid = False
+    for spec in specs:
+        spec = spec.strip()
+        if not spec: continue
+        try:
+            first, last = spec.split('-', 1)
+            if first:
+                first = int(first)
+                last = int(last) if last else None
+                if last is not None and last < first: return None
+            else:                   # Suffix range: the last bytes
+                length = int(last)
+                first = max(size - length, 0)
+                last = None
+                if length == 0: first = size # Not satisfiable
+        except ValueError:
+            return None
+        valid = True
+        if first >= size: continue  # Not satisfiable
+        if last is None or last >= size:
+            last = size - 1
+        result.append((first, last))
+    if not valid: return None
+    return result
+
+
+class FileInfo(object):
+    "Information about a file, and its contents if small enough."
+
+    __slots__ = ('path', 'size', 'mtime', 'mimetype',
+                 'etag', 'last_modified', 'data')
+
+    def __init__(self, path, size, mtime, mimetype, data=None):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.mimetype = mimetype
+        self.etag = '"%x-%x"' % (size, int(mtime * 1000000))
+        self.last_modified = email.utils.formatdate(mtime, usegmt=True)
+        self.data = data
+
+    @property
+    def cost(self):
+        "The approximate number of bytes used by the cache entry."
+        return 256 + len(self.path) + len(self.data or '')
+
+
+class FileCache(object):
+    """Bounded LRU cache of FileInfo instances keyed by normalized path.
+    An entry is invalid if the modification time or size of the file
+    has changed. The contents of files up to 'max_file_size' bytes
+    are kept, as long as the total is below 'max_bytes'.
+    Safe for use by several threads."""
 
-from .response import HTTP_INTERNAL_SERVER_ERROR, HTTP_FORBIDDEN, HTTP_NOT_FOUND
+    def __init__(self, max_entries=1024, max_bytes=16*1024*1024,
+                 max_file_size=64*1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self.entries = collections.OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, path, size, mtime):
+        "Return the valid FileInfo for the path, or None."
+        with self.lock:
+            try:
+                info = self.entries.pop(path)
+            except KeyError:
+                return None
+            if info.size != size or info.mtime != mtime:
+                self.bytes -= info.cost
+                return None
+            self.entries[path] = info # Most recently used last
+            return info
+
+    def put(self, info):
+        "Add the FileInfo, evicting least recently used entries if needed."
+        with self.lock:
+            try:
+                self.bytes -= self.entries.pop(info.path).cost
+            except KeyError:
+                pass
+            self.entries[info.path] = info
+            self.bytes += info.cost
+            while self.entries and (len(self.entries) > self.max_entries or
+                                    self.bytes > self.max_bytes):
+                path, evicted = self.entries.popitem(last=False)
+                self.bytes -= evicted.cost
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
 
 
 class FileProcessor(object):
     """Processor to return a file from a directory given by its root.
     The file path is computed by appending the URL minus a specified
-    prefix to the specified root."""
+    prefix to the specified root.
+    By default each instance has its own FileCache; another instance
+    may be given as 'cache', which may be shared, or False to disable.
+    If 'precompressed' is True, then a fresh sibling '.gz' file is
+    returned with gzip content encoding when the user agent accepts it."""
 
-    def __init__(self, root, prefix):
+    def __init__(self, root, prefix, block_size=BLOCK_SIZE, cache=None,
+                 precompressed=True):
         self.root = root
         self.prefix = prefix
+        self.block_size = block_size
+        self.precompressed = precompressed
+        if cache is None:
+            cache = FileCache()
+        elif cache is False:
+            cache = None
+        self.cache = cache
 
     def __call__(self, request, response):
         relpath = request.path
@@ -35,16 +180,160 @@ class FileProcessor(object):
             logging.error("Outside allowed directory: root='%s', path='%s'",
                           self.root, path)
             raise HTTP_FORBIDDEN()
+        info = self.get_info(path)
+        if self.precompressed:
+            gzip_info = self.get_gzip_info(request, info)
+            if gzip_info is not None:
+                add_vary(response, 'Accept-Encoding')
+                if gzip_info:
+                    info = gzip_info
+                    path = info.path
+                    response['Content-Encoding'] = 'gzip'
+        self.check_not_modified(request, info)
+        ranges = self.get_ranges(request, info)
+        response['Content-Type'] = info.mimetype
+        response['ETag'] = info.etag
+        response['Last-Modified'] = info.last_modified
+        response['Accept-Ranges'] = 'bytes'
+        if info.data is None:
+            try:
+                file = open(path, self.get_mode(info.mimetype))
+            except IOError:
+                raise HTTP_NOT_FOUND()
+            get_part = lambda first, last: FileBody(file, offset=first,
+                                                    length=last - first + 1,
+                                                    block_size=self.block_size)
+        else:
+            get_part = lambda first, last: info.data[first:last+1]
+        if ranges is None:
+            response['Content-Length'] = str(info.size)
+            if info.data is None: # Entire file; may use 'wsgi.file_wrapper'
+                response.append(FileBody(file, block_size=self.block_size))
+            else:
+                response.append(info.data)
+        elif len(ranges) == 1:
+            first, last = ranges[0]
+            response.http_code = HTTP_PARTIAL_CONTENT.http_code
+            response['Content-Range'] = "bytes %s-%s/%s" % (first, last,
+                                                            info.size)
+            response['Content-Length'] = str(last - first + 1)
+            response.append(get_part(first, last))
+        else:
+            boundary = uuid.uuid4().hex
+            response.http_code = HTTP_PARTIAL_CONTENT.http_code
+            response['Content-Type'] = "multipart/byteranges; boundary=%s" % \
+                                       boundary
+            length = 0
+            for first, last in ranges:
+                head = "\r\n--%s\r\nContent-Type: %s\r\n" \
+                       "Content-Range: bytes %s-%s/%s\r\n\r\n" % \
+                       (boundary, info.mimetype, first, last, info.size)
+                response.append(head)
+                response.append(get_part(first, last))
+                length += len(head) + last - first + 1
+            tail = "\r\n--%s--\r\n" % boundary
+            response.append(tail)
+            response['Content-Length'] = str(length + len(tail))
+
+    def get_gzip_info(self, request, info):
+        """Return the FileInfo for the precompressed sibling '.gz' file,
+        if it exists, is not older than the file, and gzip is acceptable.
+        Return False if there is no such usable sibling file, and None
+        if the user agent does not accept gzip encoding."""
+        if get_encoding(request, ('gzip',)) != 'gzip': return None
+        try:
+            gzip_info = self.get_info(info.path + '.gz',
+                                      mimetype=info.mimetype)
+        except HTTP_NOT_FOUND:
+            return False
+        if gzip_info.mtime < info.mtime: return False
+        return gzip_info
+
+    def get_info(self, path, mimetype=None):
+        """Return the FileInfo for the given path, from the cache if valid.
+        The mimetype is guessed from the path, unless given.
+        Raise HTTP_NOT_FOUND if there is no such regular file."""
         try:
+            st = os.stat(path)
+        except OSError:
+            raise HTTP_NOT_FOUND()
+        if not stat.S_ISREG(st.st_mode):
+            raise HTTP_NOT_FOUND()
+        if self.cache is not None:
+            info = self.cache.get(path, st.st_size, st.st_mtime)
+            if info is not None: return info
+        if mimetype is None:
             mimetype = self.get_mimetype(path)
-            if self.is_mimetype_text(mimetype):
-                mode = 'rt'
+        data = None
+        if self.cache is not None and st.st_size <= self.cache.max_file_size:
+            try:
+                data = open(path, self.get_mode(mimetype)).read()
+            except IOError:
+                raise HTTP_NOT_FOUND()
+            if len(data) != st.st_size: # Changed while reading; don't keep
+                data = None
+        info = FileInfo(path, st.st_size, st.st_mtime, mimetype, data=data)
+        if self.cache is not None:
+            self.cache.put(info)
+        return info
+
+    def check_not_modified(self, request, info):
+        """Raise HTTP_NOT_MODIFIED if the request is conditional
+        and the file has not been modified. An ETag with a content
+        encoding suffix added by CompressProcessor also matches."""
+        headers = request.headers
+        matched = info.etag
+        if_none_match = headers.get('If-None-Match')
+        if if_none_match:
+            for etag in if_none_match.split(','):
+                etag = etag.strip()
+                if etag.startswith('W/'): etag = etag[2:]
+                if etag == '*': break
+                if strip_etag_encoding(etag) == info.etag:
+                    matched = etag
+                    break
             else:
-                mode = 'r'
-            response['Content-Type'] = mimetype
-            response.append(open(path, mode).read())
-        except IOError:
-            raise HTTP_NOT_FOUND()
+                return
+        else:
+            if_modified_since = headers.get('If-Modified-Since')
+            if not if_modified_since: return
+            try:
+                since = email.utils.mktime_tz(
+                    email.utils.parsedate_tz(if_modified_since))
+            except (TypeError, ValueError, OverflowError):
+                return
+            if int(info.mtime) > since: return
+        raise HTTP_NOT_MODIFIED(etag=matched,
+                                last_modified=info.last_modified)
+
+    def get_ranges(self, request, info):
+        """Return the list of byte ranges (first, last) requested,
+        or None if the entire file is to be returned.
+        Raise HTTP_REQUESTED_RANGE_NOT_SATISFIABLE if no range can be
+        satisfied."""
+        if request.http_method != 'GET': return None
+        value = request.headers.get('Range')
+        if not value: return None
+        if_range = request.headers.get('If-Range')
+        if if_range:
+            if_range = if_range.strip()
+            if if_range.startswith('"') or if_range.startswith('W/'):
+                if if_range != info.etag: return None
+            elif if_range != info.last_modified:
+                return None
+        ranges = parse_range(value, info.size)
+        if ranges is None: return None
+        if not ranges:
+            raise HTTP_REQUESTED_RANGE_NOT_SATISFIABLE(
+                content_range="bytes */%s" % info.size)
+        return ranges
+
+    def get_mode(self, mimetype):
+        "Return the mode for opening the file with the given mimetype."
+        if self.is_mimetype_text(mimetype):
+            return 'rt'
+        else:
+            return 'r'
 
     def get_mimetype(self, path, strict=False):
         """Return the mimetype for the given file path.
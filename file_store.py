@@ -0,0 +1,120 @@
+""" wireframe: Minimalistic Web Resource Framework built on Python WSGI.
+
+Store of pickled values with expiry times as files in a directory.
+
+The directory may be shared by several processes on the same host,
+preferably on a memory file system such as /dev/shm. It is used by the
+file backends of the response cache and of the session store.
+
+Since the values are unpickled, which may execute arbitrary code, the
+directory must be owned by the user of the process and accessible only
+by it; it is created so if it doesn't exist, and checked otherwise.
+"""
+
+import os, os.path, stat, time, hashlib, tempfile
+import cPickle as pickle
+
+
+class FileStore(object):
+    """Values stored as files in a directory, named by a hash of the key.
+    A file is written to a temporary file which is then renamed, so a
+    reader never sees a partial entry. The modification time of a file
+    is set to the expiry time of its value."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        try:
+            os.makedirs(directory, 0700)
+        except OSError:
+            if not os.path.isdir(directory): raise
+        self.check_directory()
+
+    def check_directory(self):
+        """Raise ValueError unless the directory is a directory, not a
+        symbolic link, owned by the user of the process, and not accessible
+        by any other user."""
+        st = os.lstat(self.directory)
+        if not stat.S_ISDIR(st.st_mode):
+            raise ValueError("file store '%s' is not a directory"
+                             % self.directory)
+        if st.st_uid != os.getuid():
+            raise ValueError("file store '%s' is not owned by this user"
+                             % self.directory)
+        if st.st_mode & 0077:
+            raise ValueError("file store '%s' is accessible by other users"
+                             % self.directory)
+
+    def get_path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key).hexdigest())
+
+    def read(self, key):
+        "Return the tuple (value, expires) for the key, or None if none."
+        try:
+            with open(self.get_path(key), 'rb') as infile:
+                stored_key, value, expires = pickle.load(infile)
+        except (IOError, EOFError, ValueError, TypeError,
+                pickle.UnpicklingError):
+            return None
+        if stored_key != key: return None
+        return value, expires
+
+    def write(self, key, value, expires):
+        "Store the value for the key. Raise IOError or OSError on failure."
+        fd, tmppath = tempfile.mkstemp(dir=self.directory, prefix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as outfile:
+                pickle.dump((key, value, expires), outfile,
+                            pickle.HIGHEST_PROTOCOL)
+            os.utime(tmppath, (expires, expires))
+            os.rename(tmppath, self.get_path(key))
+        except (IOError, OSError):
+            try:
+                os.remove(tmppath)
+            except OSError:
+                pass
+            raise
+
+    def remove(self, key):
+        try:
+            os.remove(self.get_path(key))
+        except OSError:
+            pass
+
+    def get_files(self):
+        """Return the list of tuples (expires, size, path) for the files,
+        except temporary files written less than an hour ago."""
+        result = []
+        limit = time.time() - 3600
+        for filename in os.listdir(self.directory):
+            path = os.path.join(self.directory, filename)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if filename.startswith('.tmp') and st.st_ctime > limit:
+                continue            # Possibly being written
+            result.append((st.st_mtime, st.st_size, path))
+        return result
+
+    def expire(self, now):
+        "Remove the values which expired before 'now'."
+        for expires, size, path in self.get_files():
+            if expires < now:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def prune(self, max_bytes):
+        """Remove the values expiring first until the total size
+        of the files is at most 'max_bytes'."""
+        files = self.get_files()
+        total = sum([size for expires, size, path in files])
+        files.sort()
+        for expires, size, path in files:
+            if total <= max_bytes: break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
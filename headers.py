@@ -6,29 +6,97 @@ Per Kraulis
 2009-11-23  split out of response.py
 """
 
-import Cookie
+import Cookie, copy
+
+from .cookie import format_set_cookie
+
+
+COMMON_HEADERS = ('Accept', 'Accept-Charset', 'Accept-Encoding',
+                  'Accept-Language', 'Accept-Ranges', 'Age', 'Allow',
+                  'Authorization', 'Cache-Control', 'Connection',
+                  'Content-Disposition', 'Content-Encoding',
+                  'Content-Language', 'Content-Length', 'Content-Location',
+                  'Content-Range', 'Content-Type', 'Cookie', 'Date', 'ETag',
+                  'Expect', 'Expires', 'From', 'Host', 'If-Match',
+                  'If-Modified-Since', 'If-None-Match', 'If-Range',
+                  'If-Unmodified-Since', 'Last-Modified', 'Location',
+                  'Pragma', 'Range', 'Referer', 'Retry-After', 'Server',
+                  'Set-Cookie', 'TE', 'Transfer-Encoding', 'Upgrade',
+                  'User-Agent', 'Vary', 'Via', 'Warning', 'WWW-Authenticate',
+                  'X-Forwarded-For', 'X-Forwarded-Proto', 'X-Requested-With')
+
+MAX_CANONICAL = 1000            # Max number of other spellings remembered
+
+# Key: spelling of a header name; value: its interned canonical key.
+canonical_keys = dict()
+# Key: WSGI environ key 'HTTP_...'; value: interned canonical key.
+environ_keys = dict()
+
+for name in COMMON_HEADERS:
+    key = intern(name.lower())
+    for spelling in (name, key, name.upper(), key.replace('-', '_'),
+                     name.replace('-', '_'), name.upper().replace('-', '_')):
+        canonical_keys[spelling] = key
+    environ_keys['HTTP_' + name.upper().replace('-', '_')] = key
+del name, key, spelling
+
+
+def get_canonical_key(key):
+    "Return the interned canonical key: lower case with dashes."
+    try:
+        return canonical_keys[key]
+    except KeyError:
+        result = intern(key.lower().replace('_', '-'))
+        if len(canonical_keys) < MAX_CANONICAL + 6 * len(COMMON_HEADERS):
+            canonical_keys[key] = result
+        return result
 
 
 class Headers(object):
     """Container for HTTP headers, behaving as a dictionary with keys
     converted to lower case and underscores to dashes.
     An attribute 'cookie', which is a Cookie.SimpleCookie instance
-    is available for cookie output.
-    Setting an item to a value evaluating to False deletes the item."""
+    is available for cookie output; it is created on first access.
+    The method 'set_cookie' is a cheaper alternative, which formats
+    the 'Set-Cookie' value at once; it overrides the 'cookie' attribute.
+    Setting an item to a value evaluating to False deletes the item.
+    The list of header items is cached until the next change."""
+
+    __slots__ = ('_items', '_cookie', '_set_cookies', '_cached')
 
     def __init__(self):
         self._items = dict()
-        self.cookie = Cookie.SimpleCookie()
+        self._cookie = None
+        self._set_cookies = None    # Key: cookie name; value: header value
+        self._cached = None
+
+    @classmethod
+    def from_environ(cls, environ):
+        "Return a new instance containing the HTTP headers in the environ."
+        self = cls()
+        items = self._items
+        for key, value in environ.iteritems():
+            if key[:5] != 'HTTP_': continue
+            try:
+                key = environ_keys[key]
+            except KeyError:
+                key = get_canonical_key(key[5:])
+            if value:
+                items[key] = str(value)
+        return self
 
     def __str__(self):
         return str(self.items)
 
     def __getitem__(self, key):
-        return self._items[self.canonical_key(key)]
+        return self._items[get_canonical_key(key)]
 
     def __setitem__(self, key, value):
         if value:
-            self._items[self.canonical_key(key)] = str(value)
+            if value.__class__ is not str:
+                value = str(value)
+            self._items[get_canonical_key(key)] = value
+            self._cached = None
         else:
             try:
                 del self[key]
@@ -36,32 +104,66 @@ class Headers(object):
                 pass
 
     def get(self, key, default=None):
-        try:
-            return self[key]
-        except KeyError:
-            return default
+        return self._items.get(get_canonical_key(key), default)
 
     def __delitem__(self, key):
-        del self._items[self.canonical_key(key)]
+        del self._items[get_canonical_key(key)]
+        self._cached = None
+
+    def __contains__(self, key):
+        return get_canonical_key(key) in self._items
 
     def __iter__(self):
         return iter(self._items)
 
     @staticmethod
     def canonical_key(key):
-        return key.lower().replace('_', '-')
+        return get_canonical_key(key)
+
+    @property
+    def cookie(self):
+        if self._cookie is None:
+            self._cookie = Cookie.SimpleCookie()
+        return self._cookie
+
+    def set_cookie(self, key, value, **attributes):
+        """Set the cookie to be output with the given value.
+        The attributes are the keyword arguments of 'format_set_cookie'."""
+        if self._set_cookies is None:
+            self._set_cookies = dict()
+        self._set_cookies[key] = format_set_cookie(key, value, **attributes)
+
+    def has_cookies(self):
+        "Are any cookies to be output?"
+        return bool(self._cookie or self._set_cookies)
 
     def update(self, other):
         "Copy over the values from the 'other' Headers instance to this."
         for key in other:
             self[key] = other[key]
-        for key, morsel in other.cookie.items():
-            self.cookie[key] = morsel.copy()
+        if other._cookie:
+            cookie = self.cookie
+            for key, morsel in other._cookie.items():
+                # Setting a Morsel as value would make it the cookie value.
+                dict.__setitem__(cookie, key, copy.copy(morsel))
+        if other._set_cookies:
+            if self._set_cookies is None:
+                self._set_cookies = dict()
+            self._set_cookies.update(other._set_cookies)
 
     @property
     def items(self):
-        result = self._items.items()
-        for key, morsel in self.cookie.items():
-            value = str(morsel).split(':')[1].strip()
-            result.append(('Set-Cookie', value))
+        """A new list of the (key, value) header items, including
+        'Set-Cookie' items for the cookie."""
+        if self._cached is None:
+            self._cached = tuple(self._items.items())
+        result = list(self._cached)
+        set_cookies = self._set_cookies
+        if self._cookie:
+            for key, morsel in self._cookie.items():
+                if set_cookies and key in set_cookies: continue
+                result.append(('Set-Cookie', morsel.OutputString()))
+        if set_cookies:
+            for value in set_cookies.itervalues():
+                result.append(('Set-Cookie', value))
         return result
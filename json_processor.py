@@ -0,0 +1,208 @@
+""" wireframe: Minimalistic Web Resource Framework built on Python WSGI.
+
+Processors for JSON request and response bodies.
+
+A JsonInput processor checks the content type and size of the request
+body, and sets the functions used for decoding it. The body is decoded
+on first access of 'request.json'. A large top-level array may instead
+be decoded one item at a time by iterating over 'request.iter_json()'.
+
+A JsonOutput processor, which must be the last one, serializes the
+attribute 'payload' of the response set by a previous processor.
+If the payload is an iterator (e.g. a generator), then it is encoded
+as an array one item at a time while the response is sent, so that
+the whole document is never held in memory. The encoding function is
+pluggable, e.g. 'JsonOutput(dumps=ujson.dumps)'. If a ContentNegotiate
+processor was called before it, then HTTP 'Not Acceptable' is raised
+when the request does not accept 'application/json'.
+
+    application.add_map(r'^/items$',
+                        GET=(ContentNegotiate(), list_items, JsonOutput()),
+                        POST=(JsonInput(), create_item, JsonOutput()))
+"""
+
+import json
+
+from .response import (BLOCK_SIZE,
+                       HTTP_BAD_REQUEST,
+                       HTTP_REQUEST_ENTITY_TOO_LARGE,
+                       HTTP_UNSUPPORTED_MEDIA_TYPE)
+
+
+CONTENT_TYPE = 'application/json'
+WHITESPACE = ' \t\n\r'
+
+decoder = json.JSONDecoder()
+
+
+def dumps(data):
+    "Default encoding function; compact output."
+    return json.dumps(data, separators=(',', ':'))
+
+def loads(data):
+    "Default decoding function."
+    return json.loads(data)
+
+def is_json(content_type):
+    "Is the content type (without parameters) a JSON type?"
+    content_type = content_type.lower()
+    return content_type == CONTENT_TYPE or content_type.endswith('+json')
+
+def decode(data, loads=loads):
+    """Decode the JSON document, or return None if the data is empty.
+    Raise HTTP_BAD_REQUEST if it is invalid."""
+    if not data.strip(WHITESPACE): return None
+    try:
+        return loads(data)
+    except ValueError, message:
+        raise HTTP_BAD_REQUEST("invalid JSON: %s" % message)
+
+def iter_array(file, length=None, block_size=BLOCK_SIZE, max_item_size=None):
+    """Decode the items of the JSON array read from the file one at a time.
+    At most 'length' bytes are read, if given. The buffer holds at most
+    about one item and one block.
+    Raise HTTP_BAD_REQUEST if the data is not a valid JSON array, and
+    HTTP_REQUEST_ENTITY_TOO_LARGE if an item exceeds 'max_item_size'."""
+    state = dict(remaining=length)
+
+    def read(size):
+        remaining = state['remaining']
+        if remaining is not None:
+            size = min(size, remaining)
+            if size <= 0: return ''
+        data = file.read(size)
+        if remaining is not None:
+            state['remaining'] = remaining - len(data)
+        return data
+
+    buffer = ''
+    position = 0
+    expect = '['
+    while True:
+        while position < len(buffer) and buffer[position] in WHITESPACE:
+            position += 1
+        if position == len(buffer):
+            data = read(block_size)
+            if not data:
+                if expect is None: return
+                raise HTTP_BAD_REQUEST('incomplete JSON array')
+            buffer = buffer[position:] + data
+            position = 0
+            continue
+        char = buffer[position]
+        if expect is None:
+            raise HTTP_BAD_REQUEST('data after JSON array')
+        if expect == '[':
+            if char != '[':
+                raise HTTP_BAD_REQUEST('JSON data is not an array')
+            position += 1
+            expect = 'first'
+            continue
+        if char == ']' and expect != 'item':
+            position += 1
+            expect = None
+            continue
+        if expect == ',':
+            if char != ',':
+                raise HTTP_BAD_REQUEST('invalid JSON array')
+            position += 1
+            expect = 'item'
+            continue
+        # Decode an item; it is complete only if followed by ',' or ']',
+        # since e.g. a number may continue in the next block.
+        size = block_size
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                end = None
+            if end is not None:
+                following = end
+                while following < len(buffer) and \
+                      buffer[following] in WHITESPACE:
+                    following += 1
+                if following < len(buffer) and buffer[following] in ',]':
+                    break
+            if max_item_size is not None and \
+               len(buffer) - position > max_item_size:
+                raise HTTP_REQUEST_ENTITY_TOO_LARGE('JSON array item')
+            data = read(size)
+            if not data:
+                if end is not None: break
+                raise HTTP_BAD_REQUEST('invalid JSON array item')
+            buffer = buffer[position:] + data
+            position = 0
+            size *= 2           # Avoid decoding a large item too often
+        position = end
+        expect = ','
+        yield item
+
+def iter_encode(items, dumps=dumps, block_size=BLOCK_SIZE):
+    """Encode the items from the iterator as a JSON array, producing
+    strings of about 'block_size' bytes."""
+    chunks = ['[']
+    size = 1
+    separator = ''
+    for item in items:
+        data = separator + dumps(item)
+        separator = ','
+        chunks.append(data)
+        size += len(data)
+        if size >= block_size:
+            yield ''.join(chunks)
+            chunks = []
+            size = 0
+    chunks.append(']')
+    yield ''.join(chunks)
+
+
+class JsonInput(object):
+    """Processor checking that the request body, if any, is JSON and
+    not larger than 'max_size' bytes; else HTTP 'Unsupported Media Type'
+    or 'Request Entity Too Large' is raised. The given decoding function,
+    and the maximum item size for 'request.iter_json', are set in the
+    request."""
+
+    def __init__(self, max_size=10*1024*1024, max_item_size=1024*1024,
+                 loads=loads):
+        self.max_size = max_size
+        self.max_item_size = max_item_size
+        self.loads = loads
+
+    def __call__(self, request, response):
+        length = request.get_content_length()
+        if length and not is_json(request.content_type):
+            raise HTTP_UNSUPPORTED_MEDIA_TYPE("expected %s" % CONTENT_TYPE)
+        request.json_loads = self.loads
+        request.json_max_size = self.max_size
+        request.json_max_item_size = self.max_item_size
+
+
+class JsonOutput(object):
+    """Processor encoding the attribute 'payload' of the response as JSON,
+    using the given encoding function. An iterator payload is encoded
+    as an array while the response is sent. Must be the last processor.
+    Does nothing if the response has no payload."""
+
+    def __init__(self, dumps=dumps, content_type=CONTENT_TYPE,
+                 block_size=BLOCK_SIZE):
+        self.dumps = dumps
+        self.content_type = content_type
+        self.block_size = block_size
+
+    def __call__(self, request, response):
+        try:
+            payload = response.payload
+        except AttributeError:
+            return
+        negotiator = getattr(response, 'content_negotiator', None)
+        if negotiator is not None:
+            negotiator.check_acceptable(self.content_type)
+        response['Content-Type'] = self.content_type
+        if hasattr(payload, 'next'):
+            response.append(iter_encode(payload, dumps=self.dumps,
+                                        block_size=self.block_size))
+        else:
+            data = self.dumps(payload)
+            response['Content-Length'] = str(len(data))
+            response.append(data)
@@ -0,0 +1,44 @@
+""" wireframe: Minimalistic Web Resource Framework built on Python WSGI.
+
+Bounded least-recently-used cache.
+"""
+
+import threading, collections
+
+
+class LRUCache(object):
+    """Mapping of at most 'max_entries' items, the least recently used
+    being evicted first. Safe for use by several threads."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key, default=None):
+        "Return the value for the key, marking it as recently used."
+        with self.lock:
+            try:
+                value = self.entries.pop(key)
+            except KeyError:
+                return default
+            self.entries[key] = value
+            return value
+
+    def put(self, key, value):
+        "Set the value for the key, evicting the least recently used if full."
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = value
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
@@ -0,0 +1,154 @@
+""" wireframe: Minimalistic Web Resource Framework built on Python WSGI.
+
+Instrumentation of request handling.
+
+An Application given a metrics sink records the time taken by each
+stage of handling a request, per route:
+
+    'match'         finding the route for the URL path
+    'request'       creating the Request and Response instances
+    'processor:X'   each processor X in the sequence, or dispatcher method
+    'total'         all of the above, including error handling
+    'iterate'       sending the response body
+
+It also counts the requests per route, HTTP method and status class
+('2xx', '4xx', etc, or 'exception' for an unhandled exception).
+
+A sink is any object with the methods 'observe(route, stage, seconds)'
+and 'count(route, http_method, status_class)'. The Metrics class is
+a sink keeping counts and latency histograms in memory, which can be
+dumped in a text format; see 'Application.mount_metrics'.
+When no sink is given, the overhead is a few 'is None' tests.
+"""
+
+import time, bisect, threading
+
+
+timer = time.time
+
+NO_ROUTE = '-'          # Route label when no route matched
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def get_status_class(http_code):
+    "Return the status class string for the HTTP status code."
+    return "%dxx" % (http_code // 100)
+
+def get_name(processor):
+    "Return a name for the processor, for use as a stage label."
+    try:
+        return processor.__name__
+    except AttributeError:
+        return processor.__class__.__name__
+
+def escape(value):
+    "Escape a label value for the text format."
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+class Histogram(object):
+    "Counts of observations in buckets, with their sum."
+
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1) # Last is for +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+class Metrics(object):
+    """Sink keeping request counts and latency histograms in memory.
+    Safe for use by several threads."""
+
+    def __init__(self):
+        self.histograms = dict()    # Key: (route, stage)
+        self.counts = dict()        # Key: (route, http_method, status class)
+        self.lock = threading.Lock()
+
+    def observe(self, route, stage, seconds):
+        "Record the time in seconds taken by the stage for the route."
+        key = (route, stage)
+        with self.lock:
+            try:
+                histogram = self.histograms[key]
+            except KeyError:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def count(self, route, http_method, status_class):
+        "Count a request for the route, HTTP method and status class."
+        key = (route, http_method, status_class)
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def clear(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counts.clear()
+
+    def dump(self):
+        "Return the metrics in the Prometheus text exposition format."
+        with self.lock:
+            counts = sorted(self.counts.items())
+            histograms = sorted([(key, list(h.counts), h.sum, h.count)
+                                 for key, h in self.histograms.items()])
+        lines = ['# TYPE wireframe_requests_total counter']
+        for (route, http_method, status_class), count in counts:
+            lines.append('wireframe_requests_total{route="%s",method="%s",'
+                         'class="%s"} %s' % (escape(route), http_method,
+                                             status_class, count))
+        lines.append('# TYPE wireframe_stage_seconds histogram')
+        for (route, stage), bucket_counts, total, count in histograms:
+            labels = 'route="%s",stage="%s"' % (escape(route), escape(stage))
+            cumulative = 0
+            for le, bucket_count in zip(BUCKETS + ('+Inf',), bucket_counts):
+                cumulative += bucket_count
+                lines.append('wireframe_stage_seconds_bucket{%s,le="%s"} %s'
+                             % (labels, le, cumulative))
+            lines.append("wireframe_stage_seconds_sum{%s} %.6f"
+                         % (labels, total))
+            lines.append("wireframe_stage_seconds_count{%s} %s"
+                         % (labels, count))
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsProcessor(object):
+    "Processor returning the dump of a Metrics instance as plain text."
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def __call__(self, request, response):
+        response['Content-Type'] = 'text/plain; version=0.0.4'
+        response.append(self.metrics.dump())
+
+
+class TimedBody(object):
+    """Wrapper of a response recording the time taken to iterate over it,
+    from the start of iteration to its closing."""
+
+    def __init__(self, response, sink, route):
+        self.response = response
+        self.sink = sink
+        self.route = route
+        self.started = None
+
+    def __iter__(self):
+        self.started = timer()
+        return iter(self.response)
+
+    def close(self):
+        try:
+            self.response.close()
+        finally:
+            if self.started is not None:
+                self.sink.observe(self.route, 'iterate',
+                                  timer() - self.started)
@@ -0,0 +1,293 @@
+""" wireframe: Minimalistic Web Resource Framework built on Python WSGI.
+
+Incremental parsing of multipart/form-data request bodies.
+
+A MultipartParser reads the input in blocks, keeping at most about two
+blocks in memory, and produces the parts one at a time as tuples
+(headers, stream). The stream of a part must be read before the next
+part is obtained; any unread data is skipped. A large upload can thus
+be written directly to its destination:
+
+    class StreamingRequest(Request):
+        stream_multipart = True
+
+    def upload(request, response):
+        for headers, stream in request.parts:
+            if stream.filename:
+                with open(destination(stream.filename), 'wb') as outfile:
+                    stream.save(outfile)
+            else:
+                fields[stream.name] = stream.read()
+
+    application.add_map(r'^/upload$',
+                        POST=(MultipartProcessor(max_file_size=2**30),
+                              upload))
+
+The limits on the size of each field, each file and the whole body are
+enforced while reading; exceeding one raises HTTP_REQUEST_ENTITY_TOO_LARGE.
+A malformed body raises HTTP_BAD_REQUEST.
+"""
+
+import cgi
+
+from .headers import Headers
+from .response import (BLOCK_SIZE,
+                       HTTP_BAD_REQUEST,
+                       HTTP_REQUEST_ENTITY_TOO_LARGE,
+                       HTTP_INTERNAL_SERVER_ERROR)
+
+
+def get_boundary(content_type):
+    """Return the boundary parameter of the multipart/form-data
+    content type. Raise HTTP_BAD_REQUEST if none or invalid."""
+    key, params = cgi.parse_header(content_type or '')
+    if key.lower() != 'multipart/form-data':
+        raise HTTP_BAD_REQUEST('content type is not multipart/form-data')
+    boundary = params.get('boundary')
+    if not boundary or len(boundary) > 70:
+        raise HTTP_BAD_REQUEST('invalid multipart boundary')
+    return boundary
+
+def parse_headers(text):
+    "Return a Headers instance for the header lines of a part."
+    headers = Headers()
+    name = None
+    for line in text.split('\r\n'):
+        if not line: continue
+        if line[0] in ' \t':    # Continuation of the previous header
+            if name is None:
+                raise HTTP_BAD_REQUEST('invalid multipart header')
+            headers[name] = headers[name] + ' ' + line.strip()
+            continue
+        try:
+            name, value = line.split(':', 1)
+        except ValueError:
+            raise HTTP_BAD_REQUEST('invalid multipart header')
+        name = name.strip()
+        headers[name] = value.strip()
+    return headers
+
+
+class PartStream(object):
+    """File-like input stream of the data of one part, with the attributes
+    'name', 'filename' (None if not a file) and 'content_type' taken from
+    the part headers. The data is produced as it is read from the input."""
+
+    def __init__(self, parser, name, filename, content_type, max_size):
+        self.parser = parser
+        self.name = name
+        self.filename = filename
+        self.content_type = content_type
+        self.max_size = max_size
+        self.size = 0
+        self.done = False
+
+    def read(self, size=-1):
+        """Return at most 'size' bytes of data, or all remaining data if
+        'size' is negative. Return an empty string at the end of the part."""
+        if self.done or size == 0: return ''
+        if size < 0:
+            return ''.join(list(self))
+        result = self.parser.read_data(size)
+        if result:
+            self.size += len(result)
+            if self.max_size is not None and self.size > self.max_size:
+                raise HTTP_REQUEST_ENTITY_TOO_LARGE("multipart field '%s'"
+                                                    % self.name)
+        else:
+            self.done = True
+        return result
+
+    def __iter__(self):
+        "Produce the data in blocks."
+        block_size = self.parser.block_size
+        while True:
+            data = self.read(block_size)
+            if not data: break
+            yield data
+
+    def save(self, outfile):
+        """Write the remaining data to the output file.
+        Return the total size of the part data."""
+        for data in self:
+            outfile.write(data)
+        return self.size
+
+    def skip(self):
+        "Discard the remaining data."
+        for data in self: pass
+
+
+class MultipartParser(object):
+    """Iterator over the parts of a multipart/form-data body, producing
+    tuples (headers, stream), where 'headers' is a Headers instance and
+    'stream' a PartStream instance.
+    If 'content_length' is None, then the input is read until its end.
+    The size limits are in bytes; None means no limit. 'max_field_size'
+    applies to parts without filename, and 'max_file_size' to parts
+    with filename."""
+
+    def __init__(self, file, boundary, content_length=None,
+                 block_size=BLOCK_SIZE, max_field_size=64*1024,
+                 max_file_size=None, max_total_size=None, max_parts=1000,
+                 max_header_size=16*1024):
+        if max_total_size is not None and content_length is not None \
+           and content_length > max_total_size:
+            raise HTTP_REQUEST_ENTITY_TOO_LARGE('multipart body')
+        self.file = file
+        self.delimiter = '\r\n--' + boundary
+        self.remaining = content_length
+        self.block_size = max(block_size, len(self.delimiter))
+        self.max_field_size = max_field_size
+        self.max_file_size = max_file_size
+        self.max_total_size = max_total_size
+        self.max_parts = max_parts
+        self.max_header_size = max_header_size
+        self.buffer = '\r\n'    # The first delimiter has no leading CRLF
+        self.position = 0
+        self.total = 0
+        self.count = 0
+        self.current = None
+        self.started = False
+        self.finished = False
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        if self.finished: raise StopIteration
+        if self.current is None:
+            if not self.started:
+                self.skip_preamble()
+                self.started = True
+        else:
+            self.current.skip()
+            self.current = None
+        if self.is_close_delimiter():
+            self.finished = True
+            raise StopIteration
+        self.count += 1
+        if self.max_parts is not None and self.count > self.max_parts:
+            raise HTTP_REQUEST_ENTITY_TOO_LARGE('too many multipart parts')
+        headers = parse_headers(self.read_headers())
+        disposition, params = cgi.parse_header(
+            headers.get('Content-Disposition', ''))
+        name = params.get('name')
+        if disposition.lower() != 'form-data' or name is None:
+            raise HTTP_BAD_REQUEST('invalid multipart content disposition')
+        filename = params.get('filename')
+        if filename is None:
+            max_size = self.max_field_size
+        else:
+            max_size = self.max_file_size
+        content_type = headers.get('Content-Type', 'text/plain')
+        self.current = PartStream(self, name, filename, content_type, max_size)
+        return headers, self.current
+
+    def fill(self):
+        """Read another block of input into the buffer.
+        Raise HTTP_BAD_REQUEST at the end of the input."""
+        size = self.block_size
+        if self.remaining is not None:
+            size = min(size, self.remaining)
+        data = size and self.file.read(size)
+        if not data:
+            raise HTTP_BAD_REQUEST('incomplete multipart body')
+        if self.remaining is not None:
+            self.remaining -= len(data)
+        self.total += len(data)
+        if self.max_total_size is not None and self.total > self.max_total_size:
+            raise HTTP_REQUEST_ENTITY_TOO_LARGE('multipart body')
+        self.buffer = self.buffer[self.position:] + data
+        self.position = 0
+
+    def skip_preamble(self):
+        "Skip any data before the first delimiter, and the delimiter."
+        keep = len(self.delimiter) - 1
+        while True:
+            index = self.buffer.find(self.delimiter, self.position)
+            if index >= 0: break
+            self.position = max(self.position, len(self.buffer) - keep)
+            self.fill()
+        self.position = index + len(self.delimiter)
+
+    def is_close_delimiter(self):
+        "Is the delimiter just read the final one?"
+        while len(self.buffer) - self.position < 2:
+            self.fill()
+        return self.buffer.startswith('--', self.position)
+
+    def read_headers(self):
+        """Return the header lines following the delimiter just read,
+        and skip the empty line after them."""
+        while True:
+            end = self.buffer.find('\r\n', self.position)
+            if end >= 0:
+                index = self.buffer.find('\r\n\r\n', end)
+                if index >= 0: break
+            if len(self.buffer) - self.position > self.max_header_size:
+                raise HTTP_BAD_REQUEST('multipart headers too large')
+            self.fill()
+        if self.buffer[self.position:end].strip(' \t'):
+            raise HTTP_BAD_REQUEST('invalid multipart delimiter')
+        text = self.buffer[end+2:index]
+        self.position = index + 4
+        return text
+
+    def read_data(self, size):
+        """Return at most 'size' bytes of the data of the current part.
+        Return an empty string at its end, having skipped the delimiter."""
+        delimiter = self.delimiter
+        while True:
+            index = self.buffer.find(delimiter, self.position)
+            if index == self.position:
+                self.position += len(delimiter)
+                return ''
+            if index >= 0:
+                available = index - self.position
+            else:               # The end may be the start of a delimiter
+                available = len(self.buffer) - self.position - \
+                            len(delimiter) + 1
+            if available > 0:
+                size = min(size, available)
+                result = self.buffer[self.position:self.position+size]
+                self.position += size
+                return result
+            self.fill()
+
+
+class MultipartProcessor(object):
+    """Processor setting the attribute 'parts' of the request to
+    a MultipartParser for its body, with the given limits.
+    The request class must have 'stream_multipart' set to True,
+    so that the body has not already been read by cgi.FieldStorage."""
+
+    def __init__(self, block_size=BLOCK_SIZE, max_field_size=64*1024,
+                 max_file_size=None, max_total_size=None, max_parts=1000):
+        self.block_size = block_size
+        self.max_field_size = max_field_size
+        self.max_file_size = max_file_size
+        self.max_total_size = max_total_size
+        self.max_parts = max_parts
+
+    def __call__(self, request, response):
+        if not getattr(request, 'stream_multipart', False):
+            raise HTTP_INTERNAL_SERVER_ERROR('request class must have'
+                                             ' stream_multipart True')
+        environ = request.environ
+        boundary = get_boundary(environ.get('CONTENT_TYPE'))
+        try:
+            content_length = int(environ['CONTENT_LENGTH'])
+        except KeyError:
+            if not environ.get('wsgi.input_terminated'):
+                raise HTTP_BAD_REQUEST('no Content-Length')
+            content_length = None
+        except ValueError:
+            raise HTTP_BAD_REQUEST('invalid Content-Length')
+        request.parts = MultipartParser(environ['wsgi.input'], boundary,
+                                        content_length=content_length,
+                                        block_size=self.block_size,
+                                        max_field_size=self.max_field_size,
+                                        max_file_size=self.max_file_size,
+                                        max_total_size=self.max_total_size,
+                                        max_parts=self.max_parts)
@@ -7,33 +7,77 @@ Per Kraulis
 2009-11-17  fixed 'close'
 """
 
+import threading, collections, functools, hashlib
+
 import MySQLdb
 
+from .connection_pool import ConnectionPool, PoolTimeout
+from .query_cache import CachingConnection
+from .response import HTTP_SERVICE_UNAVAILABLE
+
+
+def set_connection(response, pool, connect, query_cache, scope=None):
+    """Set the attribute 'cnx' of the response to a connection checked
+    out from the pool, to be checked in when the response is closed.
+    If no pool, then open a new connection, to be closed instead.
+    If 'query_cache' is True or a QueryCache instance, then wrap the
+    connection in a CachingConnection, with the given 'scope' for the
+    entries of the QueryCache."""
+    if pool is None:
+        cnx = connect()
+        response.cleanup.append(cnx.close)
+    else:
+        try:
+            cnx = pool.checkout()
+        except PoolTimeout, message:
+            raise HTTP_SERVICE_UNAVAILABLE(str(message))
+        response.cleanup.append(functools.partial(pool.checkin, cnx))
+    if query_cache is True:
+        cnx = CachingConnection(cnx)
+    elif query_cache is not None and query_cache is not False:
+        cnx = CachingConnection(cnx, shared=query_cache, scope=scope)
+    response.cnx = cnx
+
 
 class MysqlConnect(object):
     """Processor to create and open a MySQL connection stored in
     the response instance as the attribute 'cnx'. The user and password
     is provided on instance creation.
     The MySQL connection is closed when the response instance
-    method 'close' is called."""
+    method 'close' is called.
+    If 'pooled' is True, then the connection is instead taken from,
+    and returned to, a ConnectionPool, which is created using
+    the additional keyword arguments.
+    If 'query_cache' is True, then SELECT results are memoized for
+    the request by a CachingConnection; if it is a QueryCache instance,
+    then that is used as the cache shared between requests."""
 
     def __init__(self, user=None, password=None,
-                 db=None, port=3306, host='localhost'):
+                 db=None, port=3306, host='localhost', pooled=True,
+                 query_cache=None, **pool_options):
         self.user = user
         self.password = password
         self.db = db
         self.port = port
         self.host = host
+        self.query_cache = query_cache
+        if pooled:
+            self.pool = ConnectionPool(self.connect, **pool_options)
+        else:
+            self.pool = None
 
     def __call__(self, request, response):
         """Open a connection to a MySQL server using the parameters
         provided at creation of this instance."""
-        response.cnx = MySQLdb.connect(user=self.user,
-                                       passwd=self.password,
-                                       db=self.db,
-                                       port=self.port,
-                                       host=self.host)
-        response.cleanup.append(response.cnx.close)
+        set_connection(response, self.pool, self.connect, self.query_cache)
+
+    def connect(self):
+        "Return a new connection to the MySQL server."
+        return MySQLdb.connect(user=self.user,
+                               passwd=self.password,
+                               db=self.db,
+                               port=self.port,
+                               host=self.host)
 
 
 class MysqlAuthorize(object):
@@ -43,12 +87,27 @@ class MysqlAuthorize(object):
     and 'password' in the input Request instance, or set to blank if
     non-existent. These are the members set by BasicAuthenticate.
     The MySQL connection is closed when the response instance
-    method 'close' is called."""
+    method 'close' is called.
+    If 'pooled' is True, then the connection is instead taken from,
+    and returned to, a ConnectionPool for the user, which is created
+    using the additional keyword arguments. A pool is identified by the
+    user and password, so a wrong password never gets a pooled connection.
+    At most 'max_pools' pools are kept; the least recently used is closed.
+    For 'query_cache', see MysqlConnect; the entries of a shared QueryCache
+    are keyed also by the user, so that a user never gets rows fetched
+    with the privileges of another."""
 
-    def __init__(self, db=None, port=3306, host='localhost'):
+    def __init__(self, db=None, port=3306, host='localhost', pooled=True,
+                 max_pools=100, query_cache=None, **pool_options):
         self.db = db
         self.port = port
         self.host = host
+        self.query_cache = query_cache
+        self.pooled = pooled
+        self.max_pools = max_pools
+        self.pool_options = pool_options
+        self.pools = collections.OrderedDict()
+        self.lock = threading.Lock()
 
     def __call__(self, request, response):
         """Open a connection to a MySQL server using the parameters
@@ -61,9 +120,34 @@ class MysqlAuthorize(object):
             password = request.password or ''
         except AttributeError:
             password = ''
-        response.cnx = MySQLdb.connect(user=user,
-                                       passwd=password,
-                                       db=self.db,
-                                       port=self.port,
-                                       host=self.host)
-        response.cleanup.append(response.cnx.close)
+        if self.pooled:
+            pool = self.get_pool(user, password)
+        else:
+            pool = None
+        connect = functools.partial(self.connect, user, password)
+        set_connection(response, pool, connect, self.query_cache, scope=user)
+
+    def get_pool(self, user, password):
+        "Return the connection pool for the user, creating it if needed."
+        key = (user, hashlib.sha1(password).hexdigest())
+        evicted = None
+        with self.lock:
+            try:
+                pool = self.pools.pop(key)
+            except KeyError:
+                connect = functools.partial(self.connect, user, password)
+                pool = ConnectionPool(connect, **self.pool_options)
+                if len(self.pools) >= self.max_pools:
+                    evicted = self.pools.popitem(last=False)[1]
+            self.pools[key] = pool      # Most recently used last
+        if evicted is not None:
+            evicted.close()
+        return pool
+
+    def connect(self, user, password):
+        "Return a new connection to the MySQL server for the user."
+        return MySQLdb.connect(user=user,
+                               passwd=password,
+                               db=self.db,
+                               port=self.port,
+                               host=self.host)
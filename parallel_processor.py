@@ -0,0 +1,177 @@
+""" wireframe: Minimalistic Web Resource Framework built on Python WSGI.
+
+Processor running a group of independent processors concurrently.
+
+    application.add_map(r'^/home$',
+                        GET=(ParallelProcessor([('user', get_user),
+                                                ('news', (MysqlConnect(),
+                                                          get_news))],
+                                               timeout=2.0),
+                             render_home))
+
+Each member of the group, a processor or a sequence of processors,
+is called in a thread of a shared ThreadPool with the request and its
+own new Response instance as namespace, which is set as the attribute
+of the response with the member's name. The processors of a member
+must therefore not modify the request. Since the request's attributes
+set up on first access would otherwise be set up concurrently by the
+members, those named in 'prepare' are accessed before the members are
+called; by default those which don't read the request body. A member
+must not access any other such attribute, e.g. 'cgi_fields' or 'json',
+unless it is added to 'prepare'. The cleanup operations of the
+members are added to those of the response in the order of the group,
+so that the result doesn't depend on which member finished first.
+
+If a member raises an HTTP_STATUS exception, then it is raised as soon
+as it has, without waiting for the other members; if several have, the
+first such in the order of the group. Else, when all members have
+finished, the first other exception raised by a member, if any, is
+raised. If not all members have finished within 'timeout' seconds, then
+HTTP '503 Service Unavailable' is raised. A member finishing after the
+processor has raised has its cleanup operations done at that time.
+"""
+
+import sys, threading
+
+from .response import Response, HTTP_STATUS, HTTP_SERVICE_UNAVAILABLE
+from .thread_pool import ThreadPool, PoolFull
+
+
+default_pool = None
+default_pool_lock = threading.Lock()
+
+
+def get_default_pool():
+    "Return the ThreadPool shared by default, creating it on first use."
+    global default_pool
+    with default_pool_lock:
+        if default_pool is None:
+            default_pool = ThreadPool(size=20, max_queue=200,
+                                      name='wireframe-parallel')
+        return default_pool
+
+
+class Completion(object):
+    """Event set when all members of a group have finished, or when
+    any of them has raised an HTTP_STATUS exception."""
+
+    __slots__ = ('remaining', 'event', 'lock')
+
+    def __init__(self, count):
+        self.remaining = count
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+
+    def finish(self, member):
+        "Record that the member has finished."
+        with self.lock:
+            self.remaining -= 1
+            if self.remaining <= 0 or member.has_status():
+                self.event.set()
+
+    def wait(self, timeout):
+        "Wait for the event. Return False on timeout."
+        return self.event.wait(timeout)
+
+
+class Member(object):
+    """The call of one member of a group, with its own Response namespace.
+    Any exception raised by its processors is kept in 'exc_info'."""
+
+    __slots__ = ('processors', 'namespace', 'completion', 'exc_info',
+                 'finished', 'abandoned', 'lock')
+
+    def __init__(self, processors, completion):
+        self.processors = processors
+        self.namespace = Response()
+        self.completion = completion
+        self.exc_info = None
+        self.finished = False
+        self.abandoned = False
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+        try:
+            for processor in self.processors:
+                processor(request, self.namespace)
+        except:
+            self.exc_info = sys.exc_info()
+        with self.lock:
+            self.finished = True
+            abandoned = self.abandoned
+        self.completion.finish(self)
+        if abandoned:
+            self.namespace.close()
+
+    def has_status(self):
+        "Has the member raised an HTTP_STATUS exception?"
+        return self.exc_info is not None and \
+               isinstance(self.exc_info[1], HTTP_STATUS)
+
+    def abandon(self):
+        """Close the namespace now if the member has finished, or else
+        when it finishes."""
+        with self.lock:
+            self.abandoned = True
+            finished = self.finished
+        if finished:
+            self.namespace.close()
+
+
+class ParallelProcessor(object):
+    """Processor calling the members of the group concurrently.
+    The group is a sequence of tuples (name, processor(s)).
+    The ThreadPool used is 'pool', or by default one shared by
+    all instances. The request attributes named in 'prepare' are
+    set up before the members are called."""
+
+    PREPARE = ('headers', 'cookie', 'user_agent', 'content_type')
+
+    def __init__(self, group, timeout=10.0, pool=None, prepare=PREPARE):
+        self.group = []
+        for name, processors in group:
+            if not isinstance(processors, (list, tuple)):
+                processors = (processors,)
+            self.group.append((name, tuple(processors)))
+        self.timeout = timeout
+        self.pool = pool
+        self.prepare = tuple(prepare)
+
+    def __call__(self, request, response):
+        for name in self.prepare:
+            getattr(request, name)
+        pool = self.pool or get_default_pool()
+        completion = Completion(len(self.group))
+        members = []
+        try:
+            for name, processors in self.group:
+                member = Member(processors, completion)
+                members.append((name, member))
+                pool.submit(member, request)
+        except PoolFull, message:
+            self.abandon(members)
+            raise HTTP_SERVICE_UNAVAILABLE(str(message))
+        completion.wait(self.timeout)
+        for name, member in members:
+            if member.has_status():
+                self.abandon(members)
+                exc_info = member.exc_info
+                raise exc_info[0], exc_info[1], exc_info[2]
+        unfinished = [name for name, member in members if not member.finished]
+        if unfinished:
+            self.abandon(members)
+            raise HTTP_SERVICE_UNAVAILABLE("timeout: %s" % ','.join(unfinished))
+        for name, member in members:
+            if member.exc_info is not None:
+                self.abandon(members)
+                exc_info = member.exc_info
+                raise exc_info[0], exc_info[1], exc_info[2]
+        for name, member in members:
+            setattr(response, name, member.namespace)
+            response.cleanup.extend(member.namespace.cleanup)
+            member.namespace.cleanup = []
+
+    def abandon(self, members):
+        "Have the cleanup operations of the members done when finished."
+        for name, member in members:
+            member.abandon()
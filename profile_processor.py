@@ -0,0 +1,143 @@
+""" wireframe: Minimalistic Web Resource Framework built on Python WSGI.
+
+Processor for profiling a sample of requests in production.
+
+A ProfileProcessor wraps the sequence of processors for a route:
+
+    application.add_map(r'^/report$',
+                        GET=ProfileProcessor([MysqlConnect(), report],
+                                             '/var/tmp/profiles',
+                                             sample_rate=0.01,
+                                             secret='...'))
+
+A request is profiled using cProfile if it is chosen at random according
+to the sample rate, or if it has a valid signed 'X-Wireframe-Profile'
+header, whose value is produced by the function 'sign' with the same
+secret. The statistics are saved as a '.pstats' file, whose name
+contains the time, HTTP method, URL path and wall time. The oldest
+files are removed when there are more than 'max_files' files, or
+their total size exceeds 'max_bytes'.
+"""
+
+import os, os.path, re, time, random, hmac, hashlib, threading, logging
+import cProfile
+
+from .cookie import equal
+
+
+HEADER = 'X-Wireframe-Profile'
+
+
+def sign(secret, timestamp=None):
+    "Return a signed header value for requesting profiling."
+    if timestamp is None:
+        timestamp = int(time.time())
+    timestamp = str(timestamp)
+    digest = hmac.new(secret, timestamp, hashlib.sha256).hexdigest()
+    return "%s:%s" % (timestamp, digest)
+
+def verify(secret, value, max_age=300):
+    """Is the signed header value valid, and not older than 'max_age'
+    seconds?"""
+    try:
+        timestamp, digest = value.strip().split(':', 1)
+        age = time.time() - int(timestamp)
+    except ValueError:
+        return False
+    if not -max_age <= age <= max_age: return False
+    expected = hmac.new(secret, timestamp, hashlib.sha256).hexdigest()
+    return equal(expected, digest)
+
+
+class ProfileProcessor(object):
+    """Processor wrapping a (sequence of) processor(s), which profiles
+    the requests chosen at the given sample rate (0.0 to 1.0), or having
+    a valid signed header when a secret is given."""
+
+    SAFE_REGEXP = re.compile(r'[^A-Za-z0-9.-]+')
+
+    def __init__(self, processors, directory, sample_rate=0.0, secret=None,
+                 max_files=100, max_bytes=50*1024*1024, max_age=300):
+        if isinstance(processors, (list, tuple)):
+            self.processors = tuple(processors)
+        else:
+            self.processors = (processors,)
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.secret = secret
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.count = 0
+        self.lock = threading.Lock()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def __call__(self, request, response):
+        if not self.is_chosen(request):
+            self.render(request, response)
+            return
+        profile = cProfile.Profile()
+        started = time.time()
+        try:
+            profile.runcall(self.render, request, response)
+        finally:
+            try:
+                self.save(profile, request, time.time() - started)
+            except (IOError, OSError), message:
+                logging.error("wireframe: could not save profile: %s",
+                              message)
+
+    def render(self, request, response):
+        "Produce the response by calling the processors."
+        for processor in self.processors:
+            processor(request, response)
+
+    def is_chosen(self, request):
+        "Is the request to be profiled?"
+        if self.secret:
+            value = request.headers.get(HEADER)
+            if value and verify(self.secret, value, self.max_age):
+                return True
+        return self.sample_rate > 0.0 and random.random() < self.sample_rate
+
+    def save(self, profile, request, elapsed):
+        "Save the profile statistics, and remove old files if required."
+        with self.lock:
+            self.count += 1
+            count = self.count
+        path = self.SAFE_REGEXP.sub('_', request.path).strip('_')[:80]
+        filename = "%s_%s_%s_%dms_%s-%s.pstats" % \
+                   (time.strftime('%Y%m%dT%H%M%S'),
+                    request.http_method,
+                    path or 'root',
+                    int(elapsed * 1000),
+                    os.getpid(),
+                    count)
+        filepath = os.path.join(self.directory, filename)
+        profile.dump_stats(filepath + '.tmp')
+        os.rename(filepath + '.tmp', filepath)
+        with self.lock:
+            self.rotate()
+
+    def rotate(self):
+        "Remove the oldest files until within the limits."
+        files = []
+        total = 0
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.pstats'): continue
+            filepath = os.path.join(self.directory, filename)
+            try:
+                st = os.stat(filepath)
+            except OSError:
+                continue
+            files.append((st.st_mtime, filename, st.st_size))
+            total += st.st_size
+        files.sort()
+        while files and (len(files) > self.max_files or total > self.max_bytes):
+            mtime, filename, size = files.pop(0)
+            try:
+                os.remove(os.path.join(self.directory, filename))
+            except OSError:
+                pass
+            total -= size
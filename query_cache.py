@@ -0,0 +1,278 @@
+""" wireframe: Minimalistic Web Resource Framework built on Python WSGI.
+
+Caching of the results of read-only SQL queries.
+
+A CachingConnection wraps a DB-API connection. Its cursors memoize
+the results of SELECT statements for the duration of the request;
+any other statement clears that memo. Optionally, the results of
+SELECT statements executed with a 'tags' argument are also kept
+in a QueryCache shared between requests, with a time-to-live and
+LRU eviction. Such entries are invalidated explicitly by tag, either
+by calling 'QueryCache.invalidate', or by executing a non-SELECT
+statement with a 'tags' argument.
+"""
+
+import time, threading, collections
+
+
+def is_read_only(sql):
+    "Is the SQL statement a SELECT which doesn't lock rows?"
+    head = sql.lstrip()[:6].upper()
+    if head != 'SELECT': return False
+    upper = sql.upper()
+    return 'FOR UPDATE' not in upper and 'LOCK IN SHARE MODE' not in upper
+
+def get_key(sql, args):
+    "Return the cache key for the SQL and its arguments, or None if none."
+    if args is None:
+        key = (sql, None)
+    elif isinstance(args, dict):
+        key = (sql, tuple(sorted(args.items())))
+    else:
+        key = (sql, tuple(args))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+class Result(object):
+    "The result of a query: description, rows and row count."
+
+    __slots__ = ('description', 'rows', 'rowcount')
+
+    def __init__(self, description, rows, rowcount):
+        self.description = description
+        self.rows = rows
+        self.rowcount = rowcount
+
+
+class QueryCache(object):
+    """Cache of query results shared between requests, keyed by SQL
+    and arguments, with a time-to-live in seconds and at most
+    'max_entries' entries, least recently used evicted first.
+    Each entry has a set of tags by which it can be invalidated.
+    Safe for use by several threads."""
+
+    def __init__(self, max_entries=1000, ttl=60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = collections.OrderedDict() # Value: (expires, tags, res)
+        self.tags = dict()                       # Value: set of keys
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        "Return the Result for the key, or None if none or expired."
+        with self.lock:
+            try:
+                expires, tags, result = self.entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            if expires < time.time():
+                self.discard(key, tags)
+                self.misses += 1
+                return None
+            self.entries[key] = (expires, tags, result)
+            self.hits += 1
+            return result
+
+    def put(self, key, result, tags=(), ttl=None):
+        "Store the Result for the key with the given tags."
+        if ttl is None: ttl = self.ttl
+        tags = frozenset(tags)
+        with self.lock:
+            try:
+                self.discard(key, self.entries.pop(key)[1])
+            except KeyError:
+                pass
+            self.entries[key] = (time.time() + ttl, tags, result)
+            for tag in tags:
+                self.tags.setdefault(tag, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                old_key, (expires, old_tags, old) = \
+                    self.entries.popitem(last=False)
+                self.discard(old_key, old_tags)
+
+    def discard(self, key, tags):
+        "Remove the key from the tag index. The lock must be held."
+        self.entries.pop(key, None)
+        for tag in tags:
+            keys = self.tags.get(tag)
+            if keys is None: continue
+            keys.discard(key)
+            if not keys: del self.tags[tag]
+
+    def invalidate(self, *tags):
+        "Remove all entries having any of the given tags."
+        with self.lock:
+            for tag in tags:
+                for key in self.tags.pop(tag, ()):
+                    try:
+                        expires, key_tags, result = self.entries.pop(key)
+                    except KeyError:
+                        continue
+                    self.discard(key, key_tags)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tags.clear()
+
+    def stats(self):
+        "Return a dictionary of the hit and miss counts, and size."
+        return dict(hits=self.hits, misses=self.misses,
+                    entries=len(self.entries))
+
+
+class CachingConnection(object):
+    """Wrapper of a DB-API connection producing caching cursors.
+    The per-request memo of SELECT results and its hit and miss counts
+    belong to this instance. Other attributes are those of the connection.
+    If a QueryCache is given, it is used for SELECT statements executed
+    with a 'tags' argument. Its entries are keyed also by 'scope', which
+    must identify the database user when connections for different users,
+    and thus with different privileges, share the cache."""
+
+    def __init__(self, connection, shared=None, scope=None):
+        self.connection = connection
+        self.shared = shared
+        self.scope = scope
+        self.memo = dict()
+        self.hits = 0
+        self.misses = 0
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+    def cursor(self, *args):
+        return CachingCursor(self, self.connection.cursor(*args))
+
+    def stats(self):
+        "Return a dictionary of the per-request hit and miss counts."
+        return dict(hits=self.hits, misses=self.misses)
+
+
+class CachingCursor(object):
+    """Wrapper of a DB-API cursor which takes the results of SELECT
+    statements from the caches when possible.
+    The results are keyed also by the class of the cursor, since e.g.
+    a dictionary cursor produces different rows for the same query.
+    The 'execute' method accepts the additional keyword arguments 'tags',
+    a sequence of tags for the shared cache, and 'ttl', the time-to-live
+    for the shared cache entry. The methods 'executemany' and 'callproc'
+    are considered to modify the database, as is any statement other
+    than SELECT, and also accept 'tags'. Other attributes are those
+    of the cursor."""
+
+    def __init__(self, caching, cursor):
+        self.caching = caching
+        self.cursor = cursor
+        self.result = None
+        self.position = 0
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    @property
+    def description(self):
+        if self.result is None: return self.cursor.description
+        return self.result.description
+
+    @property
+    def rowcount(self):
+        if self.result is None: return self.cursor.rowcount
+        return self.result.rowcount
+
+    def execute(self, sql, args=None, tags=None, ttl=None):
+        caching = self.caching
+        self.result = None
+        self.position = 0
+        if not is_read_only(sql):
+            self.invalidate(tags)
+            return self.cursor.execute(sql, args)
+        key = get_key(sql, args)
+        if key is None:
+            return self.cursor.execute(sql, args)
+        key = (self.cursor.__class__, key)
+        try:
+            self.result = caching.memo[key]
+        except KeyError:
+            pass
+        else:
+            caching.hits += 1
+            return self.result.rowcount
+        shared = caching.shared if tags is not None else None
+        if shared is not None:
+            shared_key = (caching.scope, key)
+            self.result = shared.get(shared_key)
+            if self.result is not None:
+                caching.memo[key] = self.result
+                caching.hits += 1
+                return self.result.rowcount
+        caching.misses += 1
+        self.cursor.execute(sql, args)
+        self.result = Result(self.cursor.description,
+                             tuple(self.cursor.fetchall()),
+                             self.cursor.rowcount)
+        caching.memo[key] = self.result
+        if shared is not None:
+            shared.put(shared_key, self.result, tags=tags, ttl=ttl)
+        return self.result.rowcount
+
+    def executemany(self, sql, args, tags=None):
+        self.result = None
+        self.position = 0
+        self.invalidate(tags)
+        return self.cursor.executemany(sql, args)
+
+    def callproc(self, procname, args=(), tags=None):
+        self.result = None
+        self.position = 0
+        self.invalidate(tags)
+        return self.cursor.callproc(procname, args)
+
+    def invalidate(self, tags):
+        """Clear the per-request memo, and the entries of the shared
+        cache having any of the tags, if given."""
+        caching = self.caching
+        caching.memo.clear()
+        if tags and caching.shared is not None:
+            caching.shared.invalidate(*tags)
+
+    def fetchone(self):
+        if self.result is None: return self.cursor.fetchone()
+        try:
+            row = self.result.rows[self.position]
+        except IndexError:
+            return None
+        self.position += 1
+        return row
+
+    def fetchmany(self, size=None):
+        if self.result is None:
+            if size is None: return self.cursor.fetchmany()
+            return self.cursor.fetchmany(size)
+        if size is None: size = self.cursor.arraysize
+        rows = self.result.rows[self.position:self.position+size]
+        self.position += len(rows)
+        return rows
+
+    def fetchall(self):
+        if self.result is None: return self.cursor.fetchall()
+        rows = self.result.rows[self.position:]
+        self.position = len(self.result.rows)
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def close(self):
+        self.result = None
+        self.cursor.close()
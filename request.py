@@ -9,31 +9,129 @@ Per Kraulis
 2010-06-27  added 'is_msie' parameter
 """
 
-import copy, cgi, Cookie, sys
+import copy, cgi, collections
 
 from .headers import Headers
+from .cookie import RequestCookie
+from .response import HTTP_BAD_REQUEST, HTTP_REQUEST_ENTITY_TOO_LARGE
+from . import json_processor
+from .user_agent import get_classifier
+
+
+# The environ keys used by cgi.FieldStorage.
+CGI_KEYS = ('REQUEST_METHOD', 'QUERY_STRING', 'CONTENT_TYPE', 'CONTENT_LENGTH')
+
+
+class EnvironView(collections.Mapping):
+    "Read-only view of the WSGI environ dictionary."
+
+    __slots__ = ('_environ',)
+
+    def __init__(self, environ):
+        self._environ = environ
+
+    def __getitem__(self, key):
+        return self._environ[key]
+
+    def __contains__(self, key):
+        return key in self._environ
+
+    def __iter__(self):
+        return iter(self._environ)
+
+    def __len__(self):
+        return len(self._environ)
+
+    def __repr__(self):
+        return "EnvironView(%r)" % self._environ
+
+    def copy(self):
+        "Return a shallow copy of the environ as a dictionary."
+        return self._environ.copy()
+
+
+class setup_on_access(object):
+    """Attribute whose value is set by calling the named setup method
+    of the instance on first access. The setup method must set the
+    attribute in the instance, which thereafter hides this descriptor."""
+
+    def __init__(self, name, setup):
+        self.name = name
+        self.setup = setup
+
+    def __get__(self, instance, owner):
+        if instance is None: return self
+        getattr(instance, self.setup)()
+        try:
+            return instance.__dict__[self.name]
+        except KeyError:
+            raise AttributeError("'%s' not set by '%s'" % (self.name,
+                                                            self.setup))
 
 
 class Request(object):
-    "Standard request class with input body interpreted as CGI form fields."
+    """Standard request class with input body interpreted as CGI form fields.
+    The attributes 'headers', 'cookie', 'user_agent', 'human_user_agent',
+    'human_user_agent_is_msie', 'content_type', 'file' and 'cgi_fields'
+    are set on first access by calling the corresponding 'setup_' method,
+    so a request pays only for what its processors actually use.
+
+    By default, the WSGI environ and the path match values are copied.
+    If the class attribute 'copy_environ' is redefined as False in
+    a subclass, then the server's environ is used directly through a
+    read-only EnvironView, and the path match values are not copied.
+
+    If the class attribute 'stream_multipart' is redefined as True in
+    a subclass, then a multipart/form-data body is not read by
+    cgi.FieldStorage; only the query string is parsed into 'cgi_fields'.
+    The body may then be read part by part; see module 'multipart'.
+
+    The attribute 'json' is the decoded JSON body, set on first access.
+    The decoding function and size limits are given by the 'json_'
+    attributes, which may be set by a JsonInput processor.
+
+    The attribute 'user_agent' is the UserAgent tuple given by the class
+    attribute 'user_agent_classifier', or if None, by the classifier
+    for the 'HUMAN_USER_AGENT_SIGNATURES'; see module 'user_agent'."""
+
+    copy_environ = True
+    stream_multipart = False
+    json_loads = staticmethod(json_processor.loads)
+    json_max_size = None
+    json_max_item_size = None
 
     HUMAN_USER_AGENT_SIGNATURES = ['mozilla', 'firefox', 'opera',
                                    'chrome', 'safari', 'msie']
+    user_agent_classifier = None
 
     def __init__(self, environ, path_values=[], path_named_values={}):
-        self.environ = environ.copy()
-        self.path_values = copy.copy(path_values) # May be other than sequence
-        self.path_named_values = path_named_values.copy()
+        if self.copy_environ:
+            self.environ = environ.copy()
+            self.path_values = copy.copy(path_values) # May be other than seq
+            self.path_named_values = path_named_values.copy()
+        else:
+            self.environ = EnvironView(environ)
+            self.path_values = path_values
+            self.path_named_values = path_named_values
         self.setup()
 
+    headers = setup_on_access('headers', 'setup_headers')
+    cookie = setup_on_access('cookie', 'setup_cookie')
+    user_agent = setup_on_access('user_agent', 'setup_human_user_agent')
+    human_user_agent = setup_on_access('human_user_agent',
+                                       'setup_human_user_agent')
+    human_user_agent_is_msie = setup_on_access('human_user_agent_is_msie',
+                                               'setup_human_user_agent')
+    content_type = setup_on_access('content_type', 'setup_content_type')
+    file = setup_on_access('file', 'setup_data')
+    cgi_fields = setup_on_access('cgi_fields', 'setup_data')
+    json = setup_on_access('json', 'setup_json')
+
     def setup(self):
-        "Standard setup of attributes according to the input data."
+        """Standard setup of attributes according to the input data.
+        The other attributes are set up lazily on first access."""
         self.setup_path()
-        self.setup_headers()
         self.setup_authenticate()
-        self.setup_human_user_agent()
-        self.setup_cookie()
-        self.setup_data()
         self.setup_http_method()
 
     def setup_path(self):
@@ -42,10 +140,7 @@ class Request(object):
 
     def setup_headers(self):
         "Obtain the HTTP headers for the request."
-        self.headers = Headers()
-        for key in self.environ:
-            if key.startswith('HTTP_'):
-                self.headers[key[5:]] = str(self.environ[key])
+        self.headers = Headers.from_environ(self.environ)
 
     def setup_authenticate(self):
         "Set the 'user' and 'password' members to None."
@@ -53,50 +148,95 @@ class Request(object):
         self.password = None
 
     def setup_human_user_agent(self):
-        "Guess whether the user agent represents a human user, i.e. a browser."
-        self.human_user_agent = False
-        self.human_user_agent_is_msie = False
-        try:
-            user_agent = self.environ['HTTP_USER_AGENT'].lower()
-            for signature in self.HUMAN_USER_AGENT_SIGNATURES:
-                if signature in user_agent:
-                    self.human_user_agent = True
-                    break
-            self.human_user_agent_is_msie = 'msie' in user_agent
-        except KeyError:
-            pass
+        """Guess whether the user agent represents a human user, i.e.
+        a browser, and classify it."""
+        classifier = self.user_agent_classifier or \
+                     get_classifier(self.HUMAN_USER_AGENT_SIGNATURES)
+        user_agent = classifier(self.environ.get('HTTP_USER_AGENT'))
+        self.user_agent = user_agent
+        self.human_user_agent = user_agent.is_human
+        self.human_user_agent_is_msie = user_agent.is_msie
 
     def setup_cookie(self):
-        "Obtain the SimpleCookie instance for the request."
-        self.cookie = Cookie.SimpleCookie(self.environ.get('HTTP_COOKIE'))
+        "Obtain the RequestCookie instance for the request."
+        self.cookie = RequestCookie(self.environ.get('HTTP_COOKIE'))
+
+    def setup_content_type(self):
+        "Obtain the content type of the input data, if any."
+        try:                    # Strip off trailing encoding info
+            self.content_type = self.environ['CONTENT_TYPE'].split(';')[0]
+        except KeyError:
+            self.content_type = 'application/octet-stream'
 
     def setup_data(self):
         """Handle the input data according to content type.
         If 'application/x-www-form-urlencoded' or 'multipart/form-data',
         then interpret the input as CGI FieldStorage according to the method,
         else set the 'file' attribute to the input file handle."""
-        try:                    # Strip off trailing encoding info
-            self.content_type = self.environ['CONTENT_TYPE'].split(';')[0]
-        except KeyError:
-            self.content_type = 'application/octet-stream'
-        if self.content_type in ('application/x-www-form-urlencoded',
-                                 'multipart/form-data'):
+        self.setup_content_type()
+        if self.stream_multipart and \
+           self.content_type == 'multipart/form-data':
             self.file = None
-            request_method = self.environ['REQUEST_METHOD']
-            if request_method == 'GET':
-                self.cgi_fields = cgi.FieldStorage(environ=self.environ)
+            self.cgi_fields = cgi.FieldStorage(environ=self.query_environ())
+        elif self.content_type in ('application/x-www-form-urlencoded',
+                                   'multipart/form-data'):
+            self.file = None
+            if self.environ['REQUEST_METHOD'] == 'GET':
+                self.cgi_fields = cgi.FieldStorage(environ=self.cgi_environ())
             else:
                 # cgi.FieldStorage problem when REQUEST_METHOD is not POST
-                self.environ['REQUEST_METHOD'] = 'POST'         # Workaround
                 fp = self.environ['wsgi.input']
-                self.cgi_fields = cgi.FieldStorage(fp=fp, environ=self.environ)
-                self.environ['REQUEST_METHOD'] = request_method # Restore
+                environ = self.cgi_environ(request_method='POST')
+                self.cgi_fields = cgi.FieldStorage(fp=fp, environ=environ)
         else:
+            # Only the query string; the body is not form data.
             self.file = self.environ['wsgi.input']
-            try:
-                self.cgi_fields = cgi.FieldStorage(environ=self.environ)
-            except IOError:     # sys.stdin is restricted in WSGI
-                self.cgi_fields = dict()
+            self.cgi_fields = cgi.FieldStorage(environ=self.query_environ())
+
+    def get_content_length(self):
+        """Return the length of the input data given by the request,
+        or 0 if none. Raise HTTP_BAD_REQUEST if invalid."""
+        try:
+            return int(self.environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            raise HTTP_BAD_REQUEST('invalid Content-Length')
+
+    def setup_json(self):
+        """Decode the input data as JSON; None if there is no data.
+        Raise HTTP_BAD_REQUEST if invalid, and HTTP_REQUEST_ENTITY_TOO_LARGE
+        if larger than 'json_max_size'."""
+        if self.json_max_size is not None and \
+           self.get_content_length() > self.json_max_size:
+            raise HTTP_REQUEST_ENTITY_TOO_LARGE('JSON data')
+        self.json = json_processor.decode(self.data or '', self.json_loads)
+
+    def iter_json(self):
+        """Return an iterator over the items of the JSON array input data,
+        which are decoded one at a time as the data is read."""
+        if self.file is None:
+            raise HTTP_BAD_REQUEST('no JSON data')
+        file = self.file
+        self.file = None
+        return json_processor.iter_array(file,
+                                         length=self.get_content_length(),
+                                         max_item_size=self.json_max_item_size)
+
+    def cgi_environ(self, request_method=None):
+        """Return a small dictionary containing the environ items used by
+        cgi.FieldStorage, optionally with another REQUEST_METHOD.
+        cgi.FieldStorage may modify it; the environ is left untouched."""
+        environ = self.environ
+        result = dict([(key, environ[key]) for key in CGI_KEYS
+                       if key in environ])
+        if request_method:
+            result['REQUEST_METHOD'] = request_method
+        return result
+
+    def query_environ(self):
+        """Return a small dictionary for cgi.FieldStorage to parse only
+        the query string, never reading the input."""
+        return dict(REQUEST_METHOD='GET',
+                    QUERY_STRING=self.environ.get('QUERY_STRING', ''))
 
     def setup_http_method(self):
         """Obtain the HTTP request for the request.
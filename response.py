@@ -12,17 +12,70 @@ import httplib, exceptions
 from .headers import Headers
 
 
+BLOCK_SIZE = 64 * 1024
+
+
+def iter_body(parts):
+    """Return a generator producing the strings of the given body parts.
+    A part which is an iterator or FileBody is iterated over lazily."""
+    for part in parts:
+        if isinstance(part, str):
+            yield part
+        elif isinstance(part, FileBody) or hasattr(part, 'next'):
+            for chunk in part:
+                yield str(chunk)
+        else:
+            yield str(part)
+
+
+class FileBody(object):
+    """Body part producing the contents of an open file in chunks
+    of fixed size, optionally restricted to the byte range given by
+    'offset' and 'length'. The file is closed when the response is."""
+
+    def __init__(self, file, offset=0, length=None, block_size=BLOCK_SIZE):
+        self.file = file
+        self.offset = offset
+        self.length = length
+        self.block_size = block_size
+
+    def __iter__(self):
+        if self.offset:
+            self.file.seek(self.offset)
+        read = self.file.read
+        block_size = self.block_size
+        if self.length is None:
+            while True:
+                chunk = read(block_size)
+                if not chunk: break
+                yield chunk
+        else:
+            remaining = self.length
+            while remaining > 0:
+                chunk = read(min(block_size, remaining))
+                if not chunk: break
+                remaining -= len(chunk)
+                yield chunk
+
+    def close(self):
+        self.file.close()
+
+
 class Response(object):
     """Basic response class.
     HTTP header items are accessed through dictionary-like calls.
     The body data is set using 'append' and is read by iterating
     over the instance.
+    A body part which is an iterator (e.g. a generator) or a FileBody
+    instance is iterated over lazily when the response is sent, so that
+    a large body need never be held in memory.
     Cleanup operation(s) to be called after the request has been
     processed may be appended as callables (taking no arguments)
     to the member list 'cleanup'."""
 
     http_code = httplib.OK      # Default; may be redefined
     content_type = 'text/plain' # Default; may be redefined
+    block_size = BLOCK_SIZE     # For 'wsgi.file_wrapper'; may be redefined
 
     def __init__(self):
         self.headers = Headers()
@@ -46,8 +99,8 @@ class Response(object):
         del self.headers[key]
 
     def __iter__(self):
-        "Return an iterator over the items in the body."
-        return iter([str(i) for i in self.body])
+        "Return an iterator over the items in the body, streaming parts."
+        return iter_body(self.body)
 
     def __del__(self):
         self.close()
@@ -55,7 +108,32 @@ class Response(object):
     def append(self, data):
         self.body.append(data)
 
+    def get_file(self):
+        """Return the file of the body if it consists of a single FileBody
+        for an entire file, else None."""
+        if len(self.body) == 1:
+            part = self.body[0]
+            if isinstance(part, FileBody) and \
+               not part.offset and part.length is None:
+                return part.file
+        return None
+
+    def detach_file(self):
+        """Remove the entire-file FileBody from the body and return its file,
+        which thereafter is the responsibility of the caller."""
+        file = self.get_file()
+        if file is not None:
+            self.body = []
+        return file
+
     def close(self):
+        for part in self.body:
+            try:
+                close = part.close
+            except AttributeError:
+                pass
+            else:
+                close()
         while self.cleanup:
             func = self.cleanup.pop()
             func()
@@ -86,6 +164,9 @@ class HTTP_ACCEPTED(HTTP_SUCCESS):
 class HTTP_NO_CONTENT(HTTP_SUCCESS):
     http_code = httplib.NO_CONTENT
 
+class HTTP_PARTIAL_CONTENT(HTTP_SUCCESS):
+    http_code = httplib.PARTIAL_CONTENT
+
 
 class HTTP_REDIRECTION(HTTP_STATUS):
     pass
@@ -147,6 +228,15 @@ class HTTP_CONFLICT(HTTP_CLIENT_ERROR):
 class HTTP_GONE(HTTP_CLIENT_ERROR):
     http_code = httplib.GONE
 
+class HTTP_REQUEST_ENTITY_TOO_LARGE(HTTP_CLIENT_ERROR):
+    http_code = httplib.REQUEST_ENTITY_TOO_LARGE
+
+class HTTP_UNSUPPORTED_MEDIA_TYPE(HTTP_CLIENT_ERROR):
+    http_code = httplib.UNSUPPORTED_MEDIA_TYPE
+
+class HTTP_REQUESTED_RANGE_NOT_SATISFIABLE(HTTP_CLIENT_ERROR):
+    http_code = httplib.REQUESTED_RANGE_NOT_SATISFIABLE
+
 
 class HTTP_SERVER_ERROR(HTTP_ERROR):
     pass
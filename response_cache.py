@@ -0,0 +1,261 @@
+""" wireframe: Minimalistic Web Resource Framework built on Python WSGI.
+
+Processor for caching the responses of idempotent GET resources.
+
+A ResponseCache wraps the sequence of processors for a route:
+
+    application.add_map(r'^/report/(?P<id>\d+)$',
+                        GET=ResponseCache([MysqlConnect(), report],
+                                          ttl=300))
+
+The status, headers and body of a successful response are stored in
+a backend, keyed by the HTTP method, URL path, query string, and the
+values of the request headers listed in the 'Vary' header of the
+response. A request with credentials, i.e. an 'Authorization' header
+or the attribute 'user' set, is neither served from nor stored in
+the cache, since the wrapped processors must authorize it. Neither is
+a request with a 'Cookie' header, unless the response has 'Cookie' in
+its 'Vary' header, since the response may be personalised by e.g. a
+session cookie. Only one request at a time renders a given key in this
+process; other requests for it wait for that rendering to be stored.
+A client sending 'Cache-Control: no-cache' (or 'Pragma: no-cache')
+gets a fresh rendering, which replaces the stored one.
+
+The backend is pluggable: MemoryBackend is a per-process LRU store
+bounded by bytes; FileBackend is a directory of files, which may be
+shared by several processes on the same host (e.g. mod_wsgi daemon
+processes).
+"""
+
+import time, threading, collections
+
+from .file_store import FileStore
+
+
+class MemoryBackend(object):
+    """In-process store of entries with time-to-live, bounded by the
+    total size 'max_bytes', least recently used evicted first.
+    Safe for use by several threads."""
+
+    def __init__(self, max_bytes=32*1024*1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.entries = collections.OrderedDict() # Value: (expires, size, v)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        "Return the value for the key, or None if none or expired."
+        with self.lock:
+            try:
+                expires, size, value = self.entries.pop(key)
+            except KeyError:
+                return None
+            if expires < time.time():
+                self.bytes -= size
+                return None
+            self.entries[key] = (expires, size, value)
+            return value
+
+    def set(self, key, value, ttl, size=0):
+        "Store the value of the given approximate size for 'ttl' seconds."
+        if size > self.max_bytes: return
+        with self.lock:
+            self.delete_locked(key)
+            self.entries[key] = (time.time() + ttl, size, value)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                old_key, (expires, old_size, old) = \
+                    self.entries.popitem(last=False)
+                self.bytes -= old_size
+
+    def delete(self, key):
+        with self.lock:
+            self.delete_locked(key)
+
+    def delete_locked(self, key):
+        try:
+            expires, size, value = self.entries.pop(key)
+        except KeyError:
+            pass
+        else:
+            self.bytes -= size
+
+
+class FileBackend(FileStore):
+    """Store of entries as files in a directory, which may be shared
+    by several processes of the same user; see module 'file_store'.
+    When the total size exceeds 'max_bytes', the files expiring first
+    are removed. The total is checked every 'check_interval' stores."""
+
+    def __init__(self, directory, max_bytes=256*1024*1024, check_interval=100):
+        super(FileBackend, self).__init__(directory)
+        self.max_bytes = max_bytes
+        self.check_interval = check_interval
+        self.count = 0
+
+    def get(self, key):
+        "Return the value for the key, or None if none or expired."
+        stored = self.read(key)
+        if stored is None: return None
+        value, expires = stored
+        if expires < time.time():
+            self.remove(key)
+            return None
+        return value
+
+    def set(self, key, value, ttl, size=0):
+        "Store the value for 'ttl' seconds."
+        if size > self.max_bytes: return
+        try:
+            self.write(key, value, time.time() + ttl)
+        except (IOError, OSError):
+            return
+        self.count += 1
+        if self.count % self.check_interval == 0:
+            self.prune(self.max_bytes)
+
+    def delete(self, key):
+        self.remove(key)
+
+
+class ResponseCache(object):
+    """Processor wrapping a (sequence of) processor(s), whose successful
+    GET or HEAD responses are cached for 'ttl' seconds.
+    If 'names' is given, then only those items of 'path_named_values'
+    are used in the key, together with the path (unless 'use_path'
+    is False) and the query string.
+    Requests with credentials are not cached, nor are requests with
+    a cookie unless the response varies by it, nor responses that set
+    a cookie, have a body which is not only strings, or have
+    'Cache-Control' private or no-store.
+    A request waits at most 'wait' seconds for another rendering the
+    same key; then it renders the response itself."""
+
+    METHODS = set(['GET', 'HEAD'])
+
+    def __init__(self, processors, ttl=60.0, backend=None, names=None,
+                 use_path=True, wait=10.0):
+        if isinstance(processors, (list, tuple)):
+            self.processors = tuple(processors)
+        else:
+            self.processors = (processors,)
+        self.ttl = ttl
+        if backend is None:
+            backend = MemoryBackend()
+        self.backend = backend
+        self.names = names
+        self.use_path = use_path
+        self.wait = wait
+        self.rendering = dict()     # Key: primary key; value: Event
+        self.lock = threading.Lock()
+
+    def __call__(self, request, response):
+        if request.http_method not in self.METHODS or \
+           self.has_credentials(request):
+            self.render(request, response)
+            return
+        primary = self.get_primary_key(request)
+        if not self.is_no_cache(request):
+            if self.restore(primary, request, response): return
+        if 'cookie' in request.headers: # Likely personalised; don't wait
+            self.render(request, response)
+            if not self.has_credentials(request):
+                self.store(primary, request, response)
+            return
+        with self.lock:
+            event = self.rendering.get(primary)
+            if event is None:
+                event = self.rendering[primary] = threading.Event()
+                leader = True
+            else:
+                leader = False
+        if not leader:              # Wait for the other rendering
+            event.wait(self.wait)
+            if self.restore(primary, request, response): return
+            self.render(request, response)
+            return
+        try:
+            self.render(request, response)
+            if not self.has_credentials(request): # Set by the processors?
+                self.store(primary, request, response)
+        finally:
+            with self.lock:
+                del self.rendering[primary]
+            event.set()
+
+    def render(self, request, response):
+        "Produce the response by calling the processors."
+        for processor in self.processors:
+            processor(request, response)
+
+    def get_primary_key(self, request):
+        "Return the key for the request, disregarding any 'Vary' headers."
+        if self.names is None:
+            values = sorted(request.path_named_values.items())
+        else:
+            values = [(n, request.path_named_values.get(n))
+                      for n in self.names]
+        path = self.use_path and request.path or ''
+        return repr((request.http_method, path,
+                     request.environ.get('QUERY_STRING', ''), values))
+
+    def get_key(self, primary, request, vary):
+        "Return the key for the request given the 'Vary' header names."
+        if not vary: return primary
+        return repr((primary,
+                     [request.headers.get(name, '') for name in vary]))
+
+    def has_credentials(self, request):
+        "Does the request carry credentials, or has it been authenticated?"
+        if 'authorization' in request.headers: return True
+        return bool(getattr(request, 'user', None))
+
+    def is_cookie_varied(self, request, vary):
+        """Unless the request has no cookie, is 'Cookie' among the names
+        of the 'Vary' header, and thus part of the key?"""
+        if 'cookie' not in request.headers: return True
+        return 'cookie' in [name.lower() for name in vary]
+
+    def is_no_cache(self, request):
+        "Does the request ask for a fresh response?"
+        cache_control = request.headers.get('Cache-Control', '').lower()
+        if 'no-cache' in cache_control: return True
+        return 'no-cache' in request.headers.get('Pragma', '').lower()
+
+    def restore(self, primary, request, response):
+        """Set the status, headers and body of the response from the cache.
+        Return False if there was no cache entry."""
+        vary = self.backend.get('vary:' + primary)
+        if vary is None: return False
+        if not self.is_cookie_varied(request, vary): return False
+        entry = self.backend.get(self.get_key(primary, request, vary))
+        if entry is None: return False
+        http_code, headers, body = entry
+        if http_code != response.http_code:
+            response.http_code = http_code
+        for key in list(response.headers):
+            del response.headers[key]
+        for key, value in headers:
+            response.headers[key] = value
+        response.body = [body]
+        return True
+
+    def store(self, primary, request, response):
+        "Store the response in the cache, if it is cachable."
+        if response.http_code != 200: return
+        if response.headers.has_cookies(): return
+        cache_control = response.get('Cache-Control', '').lower()
+        if 'private' in cache_control or 'no-store' in cache_control: return
+        if not all([isinstance(p, basestring) for p in response.body]): return
+        body = ''.join([str(p) for p in response.body])
+        response.body = [body]
+        vary = [name.strip() for name in response.get('Vary', '').split(',')
+                if name.strip()]
+        if '*' in vary: return
+        if not self.is_cookie_varied(request, vary): return
+        headers = [(key, response.headers[key]) for key in response.headers]
+        size = len(body) + sum([len(k) + len(v) for k, v in headers])
+        key = self.get_key(primary, request, vary)
+        self.backend.set(key, (response.http_code, headers, body), self.ttl,
+                         size=size)
+        self.backend.set('vary:' + primary, vary, self.ttl, size=len(vary))
@@ -0,0 +1,311 @@
+""" wireframe: Minimalistic Web Resource Framework built on Python WSGI.
+
+Compiled URL path router.
+
+The routes are kept in registration order. Consecutive regexp routes
+are combined into a single alternation regexp, which is matched in one
+call; the alternation is tried left to right, so the first route in
+registration order that matches wins, exactly as for a linear scan.
+A trie of the literal prefixes of the regexp routes allows skipping
+whole groups of regexp routes that cannot possibly match the path.
+Callable path matchers are called in their registration order.
+"""
+
+import re, threading
+
+
+# Max number of routes in one combined regexp; Python 2 sre limits
+# the number of groups in a pattern to 100.
+MAX_COMBINED = 90
+
+# Characters that may be part of a literal prefix when not escaped.
+LITERAL_CHARS = set('abcdefghijklmnopqrstuvwxyz'
+                    'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+                    '0123456789/-_~,;:=@!%&\'"<>`')
+QUANTIFIERS = set('*+?{')
+
+
+def analyze_pattern(pattern):
+    """Analyze a regular expression pattern string.
+    Return a tuple (prefix, plain), where 'prefix' is the literal string
+    that any match must begin with, and 'plain' is the pattern with all
+    capturing groups converted into non-capturing groups, or None
+    if the pattern cannot be safely combined with others, i.e. if it
+    contains backreferences, conditionals or inline flags."""
+    plain = []
+    prefix = []
+    in_prefix = True
+    combinable = True
+    depth = 0
+    i = 0
+    n = len(pattern)
+    if pattern.startswith('^'):
+        plain.append('^')
+        i = 1
+    elif pattern.startswith(r'\A'):
+        plain.append(r'\A')
+        i = 2
+    while i < n:
+        c = pattern[i]
+        if c == '\\':
+            escaped = pattern[i:i+2]
+            if len(escaped) < 2:
+                combinable = False
+            elif escaped[1].isdigit() and escaped[1] != '0':
+                combinable = False  # Numeric backreference
+            if in_prefix:
+                if len(escaped) == 2 and not escaped[1].isalnum():
+                    prefix.append(escaped[1])
+                else:
+                    in_prefix = False
+            plain.append(escaped)
+            i += 2
+            continue
+        if c == '[':                # Copy character class verbatim
+            j = i + 1
+            if j < n and pattern[j] == '^': j += 1
+            if j < n and pattern[j] == ']': j += 1
+            while j < n and pattern[j] != ']':
+                if pattern[j] == '\\': j += 1
+                j += 1
+            plain.append(pattern[i:j+1])
+            in_prefix = False
+            i = j + 1
+            continue
+        if c == '(':
+            depth += 1
+            in_prefix = False
+            if pattern.startswith('(?P<', i):
+                j = pattern.find('>', i)
+                if j < 0: return ''.join(prefix), None
+                plain.append('(?:')
+                i = j + 1
+                continue
+            elif pattern.startswith('(?P=', i) or pattern.startswith('(?(', i):
+                combinable = False
+            elif pattern.startswith('(?', i):
+                if i + 2 < n and pattern[i+2] in 'iLmsux':
+                    combinable = False  # Inline flags apply to whole regexp
+            else:
+                plain.append('(?:')
+                i += 1
+                continue
+        elif c == ')':
+            depth -= 1
+        elif c == '|':
+            if depth == 0:          # Top-level alternation; no prefix
+                del prefix[:]
+            in_prefix = False
+        elif in_prefix:
+            if c in QUANTIFIERS:
+                if prefix: prefix.pop() # Previous char is optional
+                in_prefix = False
+            elif c in LITERAL_CHARS:
+                prefix.append(c)
+            else:
+                in_prefix = False
+        plain.append(c)
+        i += 1
+    if not combinable:
+        return ''.join(prefix), None
+    return ''.join(prefix), ''.join(plain)
+
+
+class Route(object):
+    """A URL path matcher and its handler, with the group metadata
+    of a regexp path matcher computed once at creation.
+    The call chains for the HTTP methods and the 'Allow' header value
+    are set by the application when the route is first used.
+    Unpacks as the tuple (path_matcher, handler)."""
+
+    __slots__ = ('path_matcher', 'handler', 'is_callable', 'unnamed',
+                 'chains', 'allow')
+
+    def __init__(self, path_matcher, handler):
+        self.path_matcher = path_matcher
+        self.handler = handler
+        self.chains = None
+        self.allow = None
+        self.is_callable = callable(path_matcher)
+        if self.is_callable:
+            self.unnamed = None
+        else:
+            groupindex = path_matcher.groupindex
+            named = set(groupindex.values())
+            if named:               # Indices of unnamed groups, 0-based
+                self.unnamed = tuple([i for i in xrange(path_matcher.groups)
+                                      if i+1 not in named])
+            else:
+                self.unnamed = None
+
+    def __iter__(self):
+        return iter((self.path_matcher, self.handler))
+
+    def __getitem__(self, index):
+        return (self.path_matcher, self.handler)[index]
+
+    def __len__(self):
+        return 2
+
+    @property
+    def label(self):
+        "A string identifying the route, e.g. for metrics."
+        if self.is_callable:
+            return getattr(self.path_matcher, '__name__', repr(self.path_matcher))
+        return self.path_matcher.pattern
+
+    def values(self, result):
+        """Return the tuple (path_values, path_named_values) for the
+        result of a successful match by the path matcher."""
+        if self.is_callable:
+            return result, dict()
+        if self.unnamed is None:
+            return list(result.groups()), result.groupdict()
+        groups = result.groups()
+        return [groups[i] for i in self.unnamed], result.groupdict()
+
+
+class PrefixTrie(object):
+    "Trie of literal prefixes, mapping to sets of route indices."
+
+    def __init__(self):
+        self.root = ({}, set())
+
+    def add(self, prefix, index):
+        node = self.root
+        for c in prefix:
+            node = node[0].setdefault(c, ({}, set()))
+        node[1].add(index)
+
+    def lookup(self, path):
+        "Return the set of indices for all prefixes of the given path."
+        node = self.root
+        result = set(node[1])
+        for c in path:
+            try:
+                node = node[0][c]
+            except KeyError:
+                break
+            result.update(node[1])
+        return result
+
+
+class Router(object):
+    """Compiled route table built from a list of Route instances.
+    The list is shared with the application, and the router is recompiled
+    when the list has changed length. Any plain tuple (path_matcher,
+    handler) in the list is converted into a Route instance.
+    Safe for use by several threads; the trie and segments are built
+    aside and replaced together."""
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.compiled = None
+        self.compiled_length = None
+        self.lock = threading.Lock()
+
+    def compile(self):
+        """Compile the routes into the trie and the segments, unless
+        already done for the current routes. Each segment is a tuple
+        (indices, combined regexp, indices set). A segment for a callable
+        path matcher has the indices set None, and a segment for a single
+        regexp route has the combined regexp None.
+        Return the tuple (trie, segments)."""
+        with self.lock:
+            length = len(self.routes)
+            if self.compiled_length != length:
+                self.compiled = self.build(length)
+                self.compiled_length = length
+            return self.compiled
+
+    def build(self, length):
+        """Return the tuple (trie, segments) for the given number
+        of routes."""
+        trie = PrefixTrie()
+        segments = []
+        group = []
+        for index in xrange(length):
+            route = self.routes[index]
+            if not isinstance(route, Route):
+                route = Route(*route)
+                self.routes[index] = route
+            path_matcher = route.path_matcher
+            if route.is_callable:
+                self.add_group(segments, group)
+                group = []
+                segments.append(((index,), None, None))
+            else:
+                prefix, plain = self.analyze(path_matcher)
+                trie.add(prefix, index)
+                if plain is None:
+                    self.add_group(segments, group)
+                    group = []
+                    self.add_group(segments, [(index, None)])
+                else:
+                    if group and (len(group) >= MAX_COMBINED or
+                                  self.routes[group[0][0]].path_matcher.flags !=
+                                  path_matcher.flags):
+                        self.add_group(segments, group)
+                        group = []
+                    group.append((index, plain))
+        self.add_group(segments, group)
+        return trie, segments
+
+    def analyze(self, regexp):
+        "Return tuple (prefix, plain) for the compiled regexp."
+        if regexp.flags & re.VERBOSE: return '', None
+        prefix, plain = analyze_pattern(regexp.pattern)
+        if regexp.flags & re.IGNORECASE:
+            prefix = ''
+        return prefix, plain
+
+    def add_group(self, segments, group):
+        "Add a segment for a group of regexp routes to the segments."
+        if not group: return
+        indices = tuple([index for index, plain in group])
+        if len(group) == 1:
+            combined = None
+        else:
+            pattern = '|'.join(["(%s)" % plain for index, plain in group])
+            flags = self.routes[indices[0]].path_matcher.flags
+            try:
+                combined = re.compile(pattern, flags)
+            except (re.error, AssertionError, OverflowError):
+                for index in indices:
+                    segments.append(((index,), None, set([index])))
+                return
+        segments.append((indices, combined, set(indices)))
+
+    def match(self, path):
+        """Return a tuple (route, result) for the first route
+        in registration order that matches the given path, where 'result'
+        is the regexp match object, or the non-False value produced by
+        a callable path matcher.
+        Return None if no match."""
+        if self.compiled_length == len(self.routes):
+            trie, segments = self.compiled
+        else:
+            trie, segments = self.compile()
+        routes = self.routes
+        candidates = trie.lookup(path)
+        for indices, combined, index_set in segments:
+            if combined is None:
+                route = routes[indices[0]]
+                if index_set is None: # Callable path matcher
+                    try:
+                        result = route.path_matcher(path)
+                    except ValueError:
+                        continue
+                    if result:
+                        return route, result
+                    continue
+                if indices[0] not in candidates: continue
+            else:
+                if candidates.isdisjoint(index_set): continue
+                m = combined.match(path)
+                if not m: continue
+                route = routes[indices[m.lastindex - 1]]
+            m = route.path_matcher.match(path)
+            if m:
+                return route, m
+        return None
@@ -6,7 +6,9 @@ Per Kraulis
 2009-10-31
 """
 
-import uuid
+import uuid, functools
+
+from .cookie import sign, unsign
 
 
 class SessionProcessor(object):
@@ -14,23 +16,56 @@ class SessionProcessor(object):
     The identifier attribute with the given key is set in the response
     instance. The value is retrieved from the cookie if present, or it
     is set to a new value, which simultaneously sets the cookie.
-    The value is a randomly generated UUID."""
+    The value is a randomly generated UUID.
+
+    If a SessionStore is given, then the attribute 'session' of the
+    response is set to the Session for the identifier, which is saved
+    when the response is closed if modified. An identifier from the
+    cookie which is unknown to the store is replaced by a new one;
+    a new session is stored only when data has been set in it.
 
-    def __init__(self, key='sessionid', path=None):
+    If a 'secret' is given, then the cookie value is the identifier
+    signed by it, and a cookie with an invalid signature is treated
+    as absent, without looking up the identifier in the store."""
+
+    def __init__(self, key='sessionid', path=None, store=None, secret=None):
         self.key = key
         self.path = path
+        self.store = store
+        self.secret = secret
 
     def __call__(self, request, response):
-        self.response = response
         try:
-            morsel = request.cookie[self.key]
-            setattr(self.response, self.key, morsel.value)
+            value = request.cookie[self.key].value
         except KeyError:
-            value = self.get_value(request)
-            setattr(self.response, self.key, value)
-            self.response.headers.cookie[self.key] = value
-            if self.path:
-                self.response.headers.cookie[self.key]['path'] = self.path
+            value = None
+        else:
+            if self.secret:
+                value = unsign(value, self.secret)
+        if self.store is None:
+            if value is None:
+                value = self.set_value(request, response)
+        else:
+            session = None
+            if value:
+                session = self.store.load(value)
+            if session is None:
+                value = self.set_value(request, response)
+                session = self.store.create(value)
+            response.session = session
+            response.cleanup.append(functools.partial(self.store.save,
+                                                      session))
+        setattr(response, self.key, value)
+
+    def set_value(self, request, response):
+        "Set the cookie to a new session identifier value, and return it."
+        value = self.get_value(request)
+        if self.secret:
+            cookie_value = sign(value, self.secret)
+        else:
+            cookie_value = value
+        response.headers.set_cookie(self.key, cookie_value, path=self.path)
+        return value
 
     def get_value(self, request):
         "Return a session identifier value."
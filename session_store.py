@@ -0,0 +1,264 @@
+""" wireframe: Minimalistic Web Resource Framework built on Python WSGI.
+
+Storage of session data.
+
+A SessionStore keeps the data of recently used sessions in an in-process
+LRU cache, in front of a persistent backend: SqliteBackend, a local
+SQLite database file, or FileBackend, a directory of files which may be
+shared by several processes; see module 'file_store'. A session is only
+written when it has been modified, or when half of its time-to-live has
+passed, so that it doesn't expire while in use. Expired sessions are
+removed by a background thread.
+
+By default the writes are done when the response is closed. If a
+'flush_interval' is given, then the writes are instead batched and done
+by the background thread at that interval, at the cost of losing the
+last writes if the process dies. In either case, with several processes
+the data in the in-process cache may be up to 'cache_ttl' seconds stale.
+"""
+
+import time, threading, logging, sqlite3
+import cPickle as pickle
+
+from .lru_cache import LRUCache
+from .file_store import FileStore
+
+
+class Session(dict):
+    """Dictionary of the data for a session, which records whether it has
+    been modified. If a mutable value is changed in place, then the
+    method 'modified' must be called."""
+
+    def __init__(self, id, data=None, expires=None, is_new=False):
+        super(Session, self).__init__(data or ())
+        self.id = id
+        self.expires = expires
+        self.is_new = is_new
+        self.dirty = False
+
+    def modified(self):
+        "Mark the session as modified."
+        self.dirty = True
+
+    def __setitem__(self, key, value):
+        super(Session, self).__setitem__(key, value)
+        self.dirty = True
+
+    def __delitem__(self, key):
+        super(Session, self).__delitem__(key)
+        self.dirty = True
+
+    def clear(self):
+        super(Session, self).clear()
+        self.dirty = True
+
+    def pop(self, *args):
+        self.dirty = True
+        return super(Session, self).pop(*args)
+
+    def popitem(self):
+        self.dirty = True
+        return super(Session, self).popitem()
+
+    def setdefault(self, key, default=None):
+        if key not in self: self.dirty = True
+        return super(Session, self).setdefault(key, default)
+
+    def update(self, *args, **kwargs):
+        super(Session, self).update(*args, **kwargs)
+        self.dirty = True
+
+
+class SqliteBackend(object):
+    """Persistent store of session data in a local SQLite database file.
+    Safe for use by several threads."""
+
+    def __init__(self, path, table='sessions'):
+        self.table = table
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False,
+                                          isolation_level=None)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS %s"
+                                " (id TEXT PRIMARY KEY, expires REAL,"
+                                " data BLOB)" % table)
+        self.connection.execute("CREATE INDEX IF NOT EXISTS %s_expires"
+                                " ON %s (expires)" % (table, table))
+
+    def load(self, id):
+        "Return the tuple (data, expires) for the session, or None if none."
+        with self.lock:
+            row = self.connection.execute("SELECT data, expires FROM %s"
+                                          " WHERE id=?" % self.table,
+                                          (id,)).fetchone()
+        if row is None: return None
+        return pickle.loads(str(row[0])), row[1]
+
+    def save(self, items):
+        "Store the list of tuples (id, data, expires) in one transaction."
+        rows = [(id, sqlite3.Binary(pickle.dumps(data,
+                                                 pickle.HIGHEST_PROTOCOL)),
+                 expires) for id, data, expires in items]
+        with self.lock:
+            connection = self.connection
+            connection.execute('BEGIN')
+            try:
+                connection.executemany("INSERT OR REPLACE INTO %s"
+                                       " (id, data, expires) VALUES (?,?,?)"
+                                       % self.table, rows)
+            except:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+
+    def delete(self, id):
+        with self.lock:
+            self.connection.execute("DELETE FROM %s WHERE id=?" % self.table,
+                                    (id,))
+
+    def expire(self, now):
+        "Remove the sessions which expired before 'now'."
+        with self.lock:
+            self.connection.execute("DELETE FROM %s WHERE expires<?"
+                                    % self.table, (now,))
+
+
+class FileBackend(FileStore):
+    """Persistent store of session data as files in a directory, which
+    may be shared by several processes of the same user; see module
+    'file_store'. The directory must be given, e.g. a directory of its
+    own in /dev/shm."""
+
+    def __init__(self, directory):
+        super(FileBackend, self).__init__(directory)
+
+    def load(self, id):
+        "Return the tuple (data, expires) for the session, or None if none."
+        return self.read(id)
+
+    def save(self, items):
+        "Store the list of tuples (id, data, expires)."
+        for id, data, expires in items:
+            self.write(id, data, expires)
+
+    def delete(self, id):
+        self.remove(id)
+
+
+class SessionStore(object):
+    """Store of Session instances with a time-to-live 'ttl' seconds,
+    with an in-process LRU cache of at most 'max_entries' sessions,
+    each used for at most 'cache_ttl' seconds, in front of a backend.
+    Expired sessions are removed by a background thread every
+    'expire_interval' seconds. Safe for use by several threads."""
+
+    def __init__(self, backend, ttl=3600.0, max_entries=10000, cache_ttl=5.0,
+                 flush_interval=None, expire_interval=60.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.cache = LRUCache(max_entries) # Value: (data, expires, loaded)
+        self.cache_ttl = cache_ttl
+        self.flush_interval = flush_interval
+        self.expire_interval = expire_interval
+        self.pending = dict()   # Key: id; value: (data, expires)
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.thread = None
+
+    def load(self, id):
+        """Return the Session for the identifier, or None if there is
+        none, or it has expired."""
+        now = time.time()
+        self.start()
+        entry = self.cache.get(id)
+        if entry is None or entry[2] + self.cache_ttl < now:
+            with self.lock:
+                pending = self.pending.get(id)
+            if pending is None:
+                stored = self.backend.load(id)
+                if stored is None: return None
+                data, expires = stored
+            else:
+                data, expires = pending
+            entry = (data, expires, now)
+            self.cache.put(id, entry)
+        data, expires, loaded = entry
+        if expires < now: return None
+        return Session(id, data, expires=expires)
+
+    def create(self, id):
+        "Return a new empty Session with the given identifier."
+        self.start()
+        return Session(id, expires=time.time() + self.ttl, is_new=True)
+
+    def save(self, session):
+        """Store the session if it has been modified, or half its
+        time-to-live has passed. Depending on 'flush_interval', the write
+        to the backend is done now, or later by the background thread."""
+        now = time.time()
+        if not session.dirty and session.expires - now > self.ttl / 2.0:
+            return
+        expires = now + self.ttl
+        data = dict(session)
+        self.cache.put(session.id, (data, expires, now))
+        session.expires = expires
+        session.dirty = False
+        with self.lock:
+            self.pending[session.id] = (data, expires)
+        if not self.flush_interval:
+            self.flush()
+
+    def delete(self, id):
+        "Remove the session."
+        self.cache.put(id, ({}, 0, time.time()))
+        with self.lock:
+            self.pending.pop(id, None)
+        self.backend.delete(id)
+
+    def flush(self):
+        """Write the pending sessions to the backend. Only one thread at
+        a time flushes, so that an older write of a session can't
+        overwrite a newer one."""
+        with self.flush_lock:
+            with self.lock:
+                if not self.pending: return
+                items = [(id, data, expires)
+                         for id, (data, expires) in self.pending.items()]
+                self.pending = dict()
+            try:
+                self.backend.save(items)
+            except Exception, message:
+                logging.error("wireframe: could not save sessions: %s",
+                              message)
+                with self.lock: # Retry at the next flush, unless replaced
+                    for id, data, expires in items:
+                        self.pending.setdefault(id, (data, expires))
+
+    def start(self):
+        "Start the background thread, if not already done."
+        if self.thread is not None: return
+        with self.lock:
+            if self.thread is not None: return
+            self.thread = threading.Thread(target=self.run,
+                                           name='wireframe-sessions')
+            self.thread.daemon = True
+            self.thread.start()
+
+    def run(self):
+        "Flush pending sessions and remove expired ones, at intervals."
+        sleep, clock = time.sleep, time.time # Module may be gone at exit
+        interval = self.expire_interval
+        if self.flush_interval:
+            interval = min(interval, self.flush_interval)
+        expired = clock()
+        while True:
+            sleep(interval)
+            if self.flush_interval:
+                self.flush()
+            now = clock()
+            if now - expired >= self.expire_interval:
+                expired = now
+                try:
+                    self.backend.expire(now)
+                except Exception, message:
+                    logging.error("wireframe: could not expire sessions: %s",
+                                  message)
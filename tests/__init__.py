@@ -0,0 +1,6 @@
+""" wireframe: Minimalistic Web Resource Framework built on Python WSGI.
+
+Unit tests, using only the standard library:
+
+    python -m unittest discover -s wireframe/tests -t .
+"""
@@ -0,0 +1,166 @@
+""" wireframe: Minimalistic Web Resource Framework built on Python WSGI.
+
+Tests of the connection pool, using a fake DB-API module.
+"""
+
+import time, threading, logging, unittest
+
+from ..connection_pool import ConnectionPool, PoolTimeout
+
+
+class FakeError(Exception):
+    pass
+
+
+class FakeConnection(object):
+    "Connection of the fake DB-API module; 'broken' makes it fail."
+
+    def __init__(self, module):
+        self.module = module
+        self.broken = False
+        self.closed = False
+        self.rollbacks = 0
+
+    def rollback(self):
+        if self.broken: raise FakeError('connection lost')
+        self.rollbacks += 1
+
+    def ping(self):
+        if self.broken: raise FakeError('connection lost')
+
+    def close(self):
+        self.closed = True
+        self.module.open -= 1
+
+
+class FakeModule(object):
+    "Fake DB-API module counting its open connections."
+
+    def __init__(self):
+        self.open = 0
+        self.max_open = 0
+        self.lock = threading.Lock()
+
+    def connect(self):
+        with self.lock:
+            self.open += 1
+            self.max_open = max(self.max_open, self.open)
+        return FakeConnection(self)
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.module = FakeModule()
+
+    def test_reuse(self):
+        pool = ConnectionPool(self.module.connect, max_size=2)
+        connection = pool.checkout()
+        self.assertEqual(len(pool.in_use), 1)
+        pool.checkin(connection)
+        self.assertEqual(len(pool.in_use), 0)
+        self.assertEqual(len(pool.idle), 1)
+        self.assertEqual(connection.rollbacks, 1)
+        self.assert_(pool.checkout() is connection)
+        self.assertEqual(self.module.max_open, 1)
+
+    def test_checkin_foreign(self):
+        pool = ConnectionPool(self.module.connect)
+        pool.checkin(FakeConnection(self.module))
+        self.assertEqual(len(pool), 0)
+
+    def test_max_size(self):
+        pool = ConnectionPool(self.module.connect, max_size=3, timeout=5.0)
+        errors = []
+        def work():
+            try:
+                for i in xrange(20):
+                    connection = pool.checkout()
+                    self.assert_(len(pool) <= 3)
+                    time.sleep(0.001)
+                    pool.checkin(connection)
+            except Exception, error:
+                errors.append(error)
+        threads = [threading.Thread(target=work) for i in xrange(8)]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        self.assertEqual(errors, [])
+        self.assert_(self.module.max_open <= 3)
+        self.assertEqual(len(pool.in_use), 0)
+        self.assertEqual(pool.opening, 0)
+        self.assertEqual(pool.returning, 0)
+        self.assertEqual(len(pool), len(pool.idle))
+
+    def test_timeout(self):
+        pool = ConnectionPool(self.module.connect, max_size=1, timeout=0.05)
+        connection = pool.checkout()
+        start = time.time()
+        self.assertRaises(PoolTimeout, pool.checkout)
+        self.assert_(time.time() - start >= 0.05)
+        pool.checkin(connection)
+        self.assert_(pool.checkout() is connection)
+
+    def test_timeout_released(self):
+        "A waiting checkout gets the connection checked in meanwhile."
+        pool = ConnectionPool(self.module.connect, max_size=1, timeout=5.0)
+        connection = pool.checkout()
+        timer = threading.Timer(0.05, pool.checkin, (connection,))
+        timer.start()
+        self.assert_(pool.checkout() is connection)
+        timer.join()
+
+    def test_broken_on_checkin(self):
+        pool = ConnectionPool(self.module.connect, max_size=1)
+        connection = pool.checkout()
+        connection.broken = True
+        logging.disable(logging.WARNING)
+        try:
+            pool.checkin(connection)
+        finally:
+            logging.disable(logging.NOTSET)
+        self.assert_(connection.closed)
+        self.assertEqual(len(pool), 0)
+        self.assertEqual(self.module.open, 0)
+        self.assert_(pool.checkout() is not connection)
+
+    def test_broken_on_checkout(self):
+        pool = ConnectionPool(self.module.connect, max_size=1)
+        connection = pool.checkout()
+        pool.checkin(connection)
+        connection.broken = True
+        other = pool.checkout()
+        self.assert_(other is not connection)
+        self.assert_(connection.closed)
+        self.assertEqual(len(pool), 1)
+        self.assertEqual(self.module.open, 1)
+
+    def test_connect_failure(self):
+        def connect():
+            raise FakeError('cannot connect')
+        pool = ConnectionPool(connect, max_size=1, timeout=0.05)
+        self.assertRaises(FakeError, pool.checkout)
+        self.assertEqual(len(pool), 0)
+        self.assertRaises(FakeError, pool.checkout)
+
+    def test_max_lifetime(self):
+        pool = ConnectionPool(self.module.connect, max_lifetime=0.0)
+        connection = pool.checkout()
+        pool.checkin(connection)
+        self.assert_(connection.closed)
+        self.assertEqual(len(pool), 0)
+
+    def test_close(self):
+        pool = ConnectionPool(self.module.connect)
+        first = pool.checkout()
+        second = pool.checkout()
+        pool.checkin(first)
+        pool.close()
+        self.assert_(first.closed)
+        self.assertRaises(ValueError, pool.checkout)
+        pool.checkin(second)
+        self.assert_(second.closed)
+        self.assertEqual(self.module.open, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
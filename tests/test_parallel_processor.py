@@ -0,0 +1,93 @@
+""" wireframe: Minimalistic Web Resource Framework built on Python WSGI.
+
+Tests of the processor running a group of processors concurrently.
+"""
+
+import time, threading, unittest
+
+from ..parallel_processor import ParallelProcessor
+from ..thread_pool import ThreadPool
+from ..response import Response, HTTP_NOT_FOUND, HTTP_SERVICE_UNAVAILABLE
+
+
+class Request(object):
+    "Request with the attributes set up by ParallelProcessor."
+    headers = cookie = user_agent = content_type = None
+
+
+def member(value, delay=0.0, error=None, log=None):
+    "Return a processor setting 'value' after 'delay' or raising 'error'."
+    def processor(request, response):
+        time.sleep(delay)
+        if log is not None:
+            response.cleanup.append(lambda: log.append(value))
+        if error is not None: raise error
+        response.value = value
+    return processor
+
+
+class TestParallelProcessor(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = ThreadPool(size=4, max_queue=2)
+
+    def call(self, group, timeout=5.0):
+        processor = ParallelProcessor(group, timeout=timeout, pool=self.pool)
+        response = Response()
+        start = time.time()
+        try:
+            processor(Request(), response)
+        finally:
+            self.elapsed = time.time() - start
+        return response
+
+    def test_concurrent(self):
+        log = []
+        response = self.call([('a', member(1, 0.1, log=log)),
+                              ('b', member(2, 0.1, log=log))])
+        self.assertEqual(response.a.value, 1)
+        self.assertEqual(response.b.value, 2)
+        self.assert_(self.elapsed < 0.19)
+        response.close()
+        self.assertEqual(sorted(log), [1, 2])
+
+    def test_status_early(self):
+        "An HTTP status is raised without waiting for a slow member."
+        log = []
+        self.assertRaises(HTTP_NOT_FOUND, self.call,
+                          [('slow', member(1, 0.5, log=log)),
+                           ('fast', member(2, 0.0, HTTP_NOT_FOUND(), log))])
+        self.assert_(self.elapsed < 0.4)
+        time.sleep(0.6)
+        self.assertEqual(sorted(log), [1, 2]) # Cleanup when finished
+
+    def test_status_before_error(self):
+        self.assertRaises(HTTP_NOT_FOUND, self.call,
+                          [('a', member(1, 0.0, ValueError('a'))),
+                           ('b', member(2, 0.1, HTTP_NOT_FOUND()))])
+
+    def test_error(self):
+        self.assertRaises(ValueError, self.call,
+                          [('a', member(1, 0.05)),
+                           ('b', member(2, 0.0, ValueError('b')))])
+        self.assert_(self.elapsed >= 0.05)
+
+    def test_timeout(self):
+        self.assertRaises(HTTP_SERVICE_UNAVAILABLE, self.call,
+                          [('a', member(1, 0.0)), ('b', member(2, 0.5))],
+                          timeout=0.1)
+        self.assert_(self.elapsed < 0.4)
+
+    def test_pool_full(self):
+        event = threading.Event()
+        def block(request, response):
+            event.wait(5.0)
+        try:
+            self.assertRaises(HTTP_SERVICE_UNAVAILABLE, self.call,
+                              [(str(i), block) for i in xrange(7)])
+        finally:
+            event.set()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+""" wireframe: Minimalistic Web Resource Framework built on Python WSGI.
+
+Tests of the session store and its backends.
+"""
+
+import os, os.path, time, tempfile, shutil, threading, logging, unittest
+
+from ..session_store import Session, SessionStore, SqliteBackend, FileBackend
+
+
+class BackendTests(object):
+    "Tests common to the backends; 'get_backend' must be defined."
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.backend = self.get_backend()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_save_load(self):
+        expires = time.time() + 100
+        self.backend.save([('a', {'x': 1}, expires), ('b', {}, expires)])
+        self.assertEqual(self.backend.load('a'), ({'x': 1}, expires))
+        self.assertEqual(self.backend.load('b'), ({}, expires))
+        self.assertEqual(self.backend.load('c'), None)
+
+    def test_delete(self):
+        self.backend.save([('a', {'x': 1}, time.time() + 100)])
+        self.backend.delete('a')
+        self.assertEqual(self.backend.load('a'), None)
+        self.backend.delete('a')
+
+    def test_expire(self):
+        now = time.time()
+        self.backend.save([('old', {}, now - 1), ('new', {}, now + 100)])
+        self.backend.expire(now)
+        self.assertEqual(self.backend.load('old'), None)
+        self.assertNotEqual(self.backend.load('new'), None)
+
+    def test_store_concurrent(self):
+        "Several threads saving and loading their own sessions."
+        store = SessionStore(self.backend, cache_ttl=0.0)
+        errors = []
+        def work(number):
+            try:
+                id = 'id%s' % number
+                session = store.create(id)
+                for i in xrange(20):
+                    session['n'] = i
+                    store.save(session)
+                    session = store.load(id)
+                    if session['n'] != i:
+                        errors.append((id, i, session['n']))
+            except Exception, error:
+                errors.append(error)
+        threads = [threading.Thread(target=work, args=(i,))
+                   for i in xrange(8)]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        self.assertEqual(errors, [])
+        for i in xrange(8):
+            self.assertEqual(self.backend.load('id%s' % i)[0], dict(n=19))
+
+
+class TestSqliteBackend(BackendTests, unittest.TestCase):
+
+    def get_backend(self):
+        return SqliteBackend(os.path.join(self.directory, 'sessions.db'))
+
+
+class TestFileBackend(BackendTests, unittest.TestCase):
+
+    def get_backend(self):
+        return FileBackend(os.path.join(self.directory, 'sessions'))
+
+    def test_mode(self):
+        path = os.path.join(self.directory, 'sessions')
+        self.assertEqual(os.stat(path).st_mode & 0777, 0700)
+
+    def test_accessible_by_others(self):
+        path = os.path.join(self.directory, 'shared')
+        os.mkdir(path)
+        os.chmod(path, 0777)
+        self.assertRaises(ValueError, FileBackend, path)
+
+    def test_symlink(self):
+        path = os.path.join(self.directory, 'link')
+        os.symlink(os.path.join(self.directory, 'sessions'), path)
+        self.assertRaises(ValueError, FileBackend, path)
+
+
+class MemoryBackend(object):
+    "Backend counting its writes."
+
+    def __init__(self):
+        self.data = dict()
+        self.saves = 0
+
+    def load(self, id):
+        return self.data.get(id)
+
+    def save(self, items):
+        self.saves += 1
+        for id, data, expires in items:
+            self.data[id] = (data, expires)
+
+    def delete(self, id):
+        self.data.pop(id, None)
+
+    def expire(self, now):
+        for id, (data, expires) in self.data.items():
+            if expires < now: del self.data[id]
+
+
+class TestSessionStore(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = MemoryBackend()
+
+    def test_session_dirty(self):
+        session = Session('a', dict(x=1))
+        self.failIf(session.dirty)
+        session.setdefault('x', 2)
+        self.failIf(session.dirty)
+        session.setdefault('y', 2)
+        self.assert_(session.dirty)
+
+    def test_write_only_modified(self):
+        store = SessionStore(self.backend, ttl=100.0)
+        session = store.create('a')
+        session['x'] = 1
+        store.save(session)
+        self.assertEqual(self.backend.saves, 1)
+        session = store.load('a')
+        self.assertEqual(session, dict(x=1))
+        store.save(session)
+        self.assertEqual(self.backend.saves, 1)
+
+    def test_write_after_half_ttl(self):
+        store = SessionStore(self.backend, ttl=100.0)
+        session = store.create('a')
+        session.expires = time.time() + 40.0
+        store.save(session)
+        self.assertEqual(self.backend.saves, 1)
+        self.assert_(session.expires > time.time() + 90.0)
+
+    def test_expired(self):
+        store = SessionStore(self.backend)
+        self.backend.save([('a', {}, time.time() - 1)])
+        self.assertEqual(store.load('a'), None)
+        self.assertEqual(store.load('b'), None)
+
+    def test_delete(self):
+        store = SessionStore(self.backend)
+        session = store.create('a')
+        session['x'] = 1
+        store.save(session)
+        store.delete('a')
+        self.assertEqual(store.load('a'), None)
+        self.assertEqual(self.backend.load('a'), None)
+
+    def test_flush_interval(self):
+        store = SessionStore(self.backend, flush_interval=0.05)
+        session = store.create('a')
+        session['x'] = 1
+        store.save(session)
+        self.assertEqual(self.backend.load('a'), None)
+        self.assertEqual(store.load('a'), dict(x=1))
+        deadline = time.time() + 5.0
+        while self.backend.load('a') is None and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.backend.load('a')[0], dict(x=1))
+
+    def test_failed_flush_retried(self):
+        store = SessionStore(self.backend, flush_interval=3600.0)
+        session = store.create('a')
+        session['x'] = 1
+        store.save(session)
+        save = self.backend.save
+        def fail(items):
+            raise IOError('disk full')
+        self.backend.save = fail
+        logging.disable(logging.ERROR)
+        try:
+            store.flush()
+        finally:
+            logging.disable(logging.NOTSET)
+        self.backend.save = save
+        store.flush()
+        self.assertEqual(self.backend.load('a')[0], dict(x=1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+""" wireframe: Minimalistic Web Resource Framework built on Python WSGI.
+
+Tests of the bounded pool of worker threads.
+"""
+
+import time, threading, unittest
+
+from ..thread_pool import ThreadPool, PoolFull
+
+
+class TestThreadPool(unittest.TestCase):
+
+    def test_result(self):
+        pool = ThreadPool(size=2)
+        task = pool.submit(lambda x, y=0: x + y, 1, y=2)
+        self.assert_(task.wait(5.0))
+        self.assert_(task.done())
+        self.assertEqual(task.get(), 3)
+
+    def test_exception(self):
+        pool = ThreadPool(size=1)
+        task = pool.submit(int, 'x')
+        task.wait(5.0)
+        self.assertRaises(ValueError, task.get)
+
+    def test_size(self):
+        "At most 'size' tasks run at the same time."
+        pool = ThreadPool(size=3, max_queue=None)
+        lock = threading.Lock()
+        running = [0, 0]            # Current, max
+        def work():
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+        tasks = [pool.submit(work) for i in xrange(30)]
+        for task in tasks:
+            self.assert_(task.wait(5.0))
+        self.assertEqual(running[1], 3)
+        self.assertEqual(len(pool.threads), 3)
+
+    def test_full(self):
+        pool = ThreadPool(size=1, max_queue=2)
+        event = threading.Event()
+        started = threading.Event()
+        def block():
+            started.set()
+            event.wait(5.0)
+        first = pool.submit(block)
+        started.wait(5.0)
+        waiting = [pool.submit(block), pool.submit(block)]
+        self.assertRaises(PoolFull, pool.submit, block)
+        event.set()
+        for task in [first] + waiting:
+            self.assert_(task.wait(5.0))
+        pool.submit(block).wait(5.0)
+
+    def test_concurrent_submit(self):
+        "Several threads submitting start the threads only once."
+        pool = ThreadPool(size=4, max_queue=None)
+        tasks = []
+        def submit():
+            for i in xrange(50):
+                tasks.append(pool.submit(lambda i=i: i * 2))
+        threads = [threading.Thread(target=submit) for i in xrange(8)]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        self.assertEqual(len(pool.threads), 4)
+        for task in tasks:
+            self.assert_(task.wait(5.0))
+        self.assertEqual(sum([task.get() for task in tasks]),
+                         8 * sum(range(0, 100, 2)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+""" wireframe: Minimalistic Web Resource Framework built on Python WSGI.
+
+Bounded pool of worker threads.
+
+A ThreadPool runs the functions submitted to it in at most 'size'
+threads. At most 'max_queue' submitted functions may wait for a thread;
+beyond that, 'submit' raises PoolFull, so that an overloaded server
+can refuse requests at once instead of queueing them indefinitely.
+"""
+
+import sys, threading, Queue
+
+
+class PoolFull(Exception):
+    "The queue of the thread pool is full."
+    pass
+
+
+class Task(object):
+    "A function submitted to a ThreadPool, and its outcome."
+
+    __slots__ = ('func', 'args', 'kwargs', 'result', 'exc_info', 'event')
+
+    def __init__(self, func, args, kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.result = None
+        self.exc_info = None
+        self.event = threading.Event()
+
+    def run(self):
+        try:
+            self.result = self.func(*self.args, **self.kwargs)
+        except:
+            self.exc_info = sys.exc_info()
+        self.event.set()
+
+    def done(self):
+        "Has the function finished?"
+        return self.event.is_set()
+
+    def wait(self, timeout=None):
+        "Wait for the function to finish. Return False on timeout."
+        return self.event.wait(timeout)
+
+    def get(self):
+        """Return the result of the finished function, or raise the
+        exception that it raised."""
+        if self.exc_info is not None:
+            raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+        return self.result
+
+
+class ThreadPool(object):
+    """Pool of at most 'size' daemon threads, started on first use,
+    with a queue of at most 'max_queue' waiting tasks (None: unbounded).
+    Safe for use by several threads."""
+
+    def __init__(self, size=10, max_queue=100, name='wireframe-pool'):
+        assert size > 0
+        self.size = size
+        self.name = name
+        self.queue = Queue.Queue(max_queue or 0)
+        self.threads = []
+        self.lock = threading.Lock()
+
+    def submit(self, func, *args, **kwargs):
+        """Submit the function to be called with the arguments in a thread.
+        Return the Task. Raise PoolFull if the queue is full."""
+        if len(self.threads) < self.size:
+            self.start()
+        task = Task(func, args, kwargs)
+        try:
+            self.queue.put_nowait(task)
+        except Queue.Full:
+            raise PoolFull("%s: %s tasks waiting" % (self.name,
+                                                     self.queue.qsize()))
+        return task
+
+    def start(self):
+        "Start the threads, if not already done."
+        with self.lock:
+            while len(self.threads) < self.size:
+                thread = threading.Thread(target=self.work,
+                                          name="%s-%s" % (self.name,
+                                                          len(self.threads)))
+                thread.daemon = True
+                thread.start()
+                self.threads.append(thread)
+
+    def work(self):
+        "Run tasks from the queue forever."
+        get = self.queue.get
+        while True:
+            get().run()
@@ -0,0 +1,114 @@
+""" wireframe: Minimalistic Web Resource Framework built on Python WSGI.
+
+Classification of the User-Agent header of requests.
+
+A UserAgentClassifier matches a User-Agent string against all its
+signatures with one precompiled regular expression, and caches the
+resulting UserAgent tuple in an LRU cache keyed by the raw string,
+since most traffic comes from a small number of distinct user agents.
+
+The 'is_human' value is true if any of the human signatures occurs in
+the string, as before, which is what decides whether human-readable
+error output is produced. The 'kind' is a richer classification into
+HUMAN, BOT or API, or OTHER, which processors may use for instance for
+rate decisions. It is given by the method 'get_kind', which may be
+redefined in a subclass, as may the signatures. The function
+'get_classifier' returns the classifier for a given sequence of human
+signatures, created once per distinct sequence.
+"""
+
+import re, threading, collections
+
+from .lru_cache import LRUCache
+
+
+HUMAN = 'human'
+BOT = 'bot'
+API = 'api'
+OTHER = 'other'
+
+HUMAN_SIGNATURES = ('mozilla', 'firefox', 'opera', 'chrome', 'safari', 'msie')
+BOT_SIGNATURES = ('bot', 'crawl', 'spider', 'slurp', 'archiver',
+                  'facebookexternalhit', 'mediapartners')
+API_SIGNATURES = ('curl', 'wget', 'python', 'java/', 'go-http-client',
+                  'okhttp', 'libwww', 'httpclient', 'ruby', 'php')
+
+
+UserAgent = collections.namedtuple('UserAgent', 'is_human is_msie kind')
+
+UNKNOWN_USER_AGENT = UserAgent(False, False, OTHER)
+
+
+class UserAgentClassifier(object):
+    """Classify User-Agent strings, caching the results for at most
+    'max_entries' distinct strings. Strings longer than 'max_length'
+    are classified, but not cached. If 'human_signatures' is given, then
+    it replaces those of the class. Safe for use by several threads."""
+
+    human_signatures = HUMAN_SIGNATURES
+    bot_signatures = BOT_SIGNATURES
+    api_signatures = API_SIGNATURES
+
+    def __init__(self, max_entries=1024, max_length=512,
+                 human_signatures=None):
+        if human_signatures is not None:
+            self.human_signatures = tuple(human_signatures)
+        self.max_length = max_length
+        self.cache = LRUCache(max_entries)
+        self.signatures = dict()    # Key: signature; value: kind
+        for kind, signatures in ((API, self.api_signatures),
+                                 (BOT, self.bot_signatures),
+                                 (HUMAN, self.human_signatures)):
+            for signature in signatures:
+                self.signatures[signature.lower()] = kind
+        # Longest first, so that a signature containing another is found.
+        signatures = sorted(self.signatures, key=len, reverse=True)
+        self.matcher = re.compile('|'.join([re.escape(s) for s in signatures]),
+                                  re.IGNORECASE)
+
+    def __call__(self, user_agent):
+        "Return the UserAgent tuple for the User-Agent string."
+        if not user_agent: return UNKNOWN_USER_AGENT
+        result = self.cache.get(user_agent)
+        if result is None:
+            result = self.classify(user_agent)
+            if len(user_agent) <= self.max_length:
+                self.cache.put(user_agent, result)
+        return result
+
+    def classify(self, user_agent):
+        """Return the UserAgent tuple for the User-Agent string, uncached.
+        'is_msie' doesn't depend on the signatures."""
+        matches = set([m.lower() for m in self.matcher.findall(user_agent)])
+        kinds = set([self.signatures[m] for m in matches])
+        return UserAgent(HUMAN in kinds,
+                         'msie' in user_agent.lower(),
+                         self.get_kind(user_agent, matches, kinds))
+
+    def get_kind(self, user_agent, matches, kinds):
+        """Return the kind of user agent, given the set of matched
+        signatures and the set of their kinds."""
+        if BOT in kinds: return BOT
+        if HUMAN in kinds: return HUMAN
+        if API in kinds: return API
+        return OTHER
+
+
+# Key: tuple of human signatures; value: UserAgentClassifier.
+classifiers = dict()
+classifiers_lock = threading.Lock()
+
+
+def get_classifier(human_signatures):
+    """Return the UserAgentClassifier for the sequence of human signatures,
+    creating it on first use."""
+    key = tuple(human_signatures)
+    try:
+        return classifiers[key]
+    except KeyError:
+        with classifiers_lock:
+            if key not in classifiers:
+                classifiers[key] = UserAgentClassifier(human_signatures=key)
+            return classifiers[key]
+
+default_classifier = get_classifier(HUMAN_SIGNATURES)